@@ -3,6 +3,11 @@
 # See LICENSE file for licensing details.
 #
 # Learn more at: https://juju.is/docs/sdk
+#
+# Local fork of loki_k8s.v0.loki_push_api at LIBPATCH 28, extended with log globbing and
+# path labels, streamed promtail downloads, the install manifest, change-only promtail
+# restarts and promtail_pipeline_stages. `charmcraft fetch-lib` would overwrite these
+# changes; merge upstream patches by hand instead.
 
 r"""## Overview.
 
@@ -332,6 +337,18 @@ juju deploy \
 If a different resource name is used, it can be specified with the `promtail_resource_name`
 argument to the `LogProxyConsumer` constructor.
 
+Lines can be parsed and filtered by promtail before they are shipped, by passing
+`pipeline_stages` to the constructor. `promtail_pipeline_stages` generates the common ones:
+level extraction from JSON or logfmt lines, a `level` label and dropping levels.
+
+```python
+self._log_proxy = LogProxyConsumer(
+    self,
+    log_files=LOG_FILES,
+    pipeline_stages=promtail_pipeline_stages(log_format="json", drop_levels=["debug"]),
+)
+```
+
 The object can emit a `PromtailDigestError` event:
 
 - Promtail binary cannot be downloaded.
@@ -446,10 +463,9 @@ import socket
 import subprocess
 import tempfile
 import typing
+import zlib
 from copy import deepcopy
-from gzip import GzipFile
 from hashlib import sha256
-from io import BytesIO
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple, Union, cast
 from urllib import request
@@ -513,6 +529,9 @@ WORKLOAD_CONFIG_PATH = "{}/{}".format(WORKLOAD_CONFIG_DIR, WORKLOAD_CONFIG_FILE_
 WORKLOAD_POSITIONS_PATH = "{}/positions.yaml".format(WORKLOAD_BINARY_DIR)
 WORKLOAD_SERVICE_NAME = "promtail"
 
+# Size of the chunks promtail is downloaded, decompressed and hashed in
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
 HTTP_LISTEN_PORT = 9080
 GRPC_LISTEN_PORT = 9095
 
@@ -1691,6 +1710,17 @@ class MultipleContainersFoundError(Exception):
         super().__init__(self.message)
 
 
+class PromtailChecksumError(Exception):
+    """Raised if a downloaded Promtail binary does not match its expected sha256sum."""
+
+    def __init__(self, expected: str, actual: str):
+        self.message = "Promtail sha256sum mismatch, expected '{}' but got '{}'".format(
+            expected, actual
+        )
+
+        super().__init__(self.message)
+
+
 class PromtailDigestError(EventBase):
     """Event emitted when there is an error with Promtail initialization."""
 
@@ -1715,6 +1745,42 @@ class LogProxyEndpointJoined(EventBase):
     """Event emitted when a Log Proxy joins."""
 
 
+def promtail_pipeline_stages(
+    log_format: str = "",
+    level_key: str = "level",
+    drop_levels: Optional[List[str]] = None,
+) -> List[dict]:
+    """Generates promtail pipeline stages for common log processing.
+
+    Args:
+        log_format: "json" or "logfmt" to extract the level of each line into a `level`
+            label; any other value leaves lines unparsed.
+        level_key: the key holding the level in JSON or logfmt lines.
+        drop_levels: levels whose lines are dropped before shipping, e.g. ["debug"].
+            Requires a `log_format`.
+
+    Returns:
+        A list of dictionaries representing the pipeline_stages section.
+    """
+    stages = []  # type: List[dict]
+
+    if log_format == "json":
+        stages.append({"json": {"expressions": {"level": level_key}}})
+    elif log_format == "logfmt":
+        # A regex rather than the logfmt stage, which promtail only has since 2.8
+        expression = r'(?:^|\s){}="?(?P<level>[^"\s]+)'.format(re.escape(level_key))
+        stages.append({"regex": {"expression": expression}})
+
+    if stages:
+        stages.append({"labels": {"level": None}})
+
+        if drop_levels:
+            levels = "|".join(re.escape(level) for level in drop_levels)
+            stages.append({"drop": {"source": "level", "expression": "(?i)^({})$".format(levels)}})
+
+    return stages
+
+
 class LogProxyEvents(ObjectEvents):
     """Event descriptor for events raised by `LogProxyConsumer`."""
 
@@ -1736,7 +1802,9 @@ class LogProxyConsumer(ConsumerBase):
     Args:
         charm: a `CharmBase` object that manages this `LokiPushApiConsumer` object.
             Typically, this is `self` in the instantiating class.
-        log_files: a list of log files to monitor with Promtail.
+        log_files: a list of log files to monitor with Promtail. Entries may be glob
+            patterns (e.g. "/var/log/app/*.log"); all of them are tailed by a single
+            static config.
         relation_name: the string name of the relation interface to look up.
             If `charm` has exactly one relation with this interface, the relation's
             name is returned. If none or multiple relations with the provided interface
@@ -1752,6 +1820,12 @@ class LogProxyConsumer(ConsumerBase):
         container_name: An optional container name to inject the payload into.
         promtail_resource_name: An optional promtail resource name from metadata
             if it has been modified and attached
+        insecure_skip_verify: Skip TLS verification of the Loki endpoints.
+        path_label_regex: An optional regular expression matched against the path of
+            every tailed file; each named group becomes a label on that file's lines,
+            e.g. r"/var/log/(?P<log_source>[^/.]+)".
+        pipeline_stages: Optional promtail pipeline stages applied to the tailed files,
+            after the path labels, e.g. from `promtail_pipeline_stages`.
 
     Raises:
         RelationNotFoundError: If there is no relation in the charm's metadata.yaml
@@ -1779,6 +1853,8 @@ class LogProxyConsumer(ConsumerBase):
         promtail_resource_name: Optional[str] = None,
         *,  # TODO: In v1, move the star up so everything after 'charm' is a kwarg
         insecure_skip_verify: bool = False,
+        path_label_regex: Optional[str] = None,
+        pipeline_stages: Optional[List[dict]] = None,
     ):
         super().__init__(charm, relation_name, alert_rules_path, recursive)
         self._charm = charm
@@ -1794,6 +1870,11 @@ class LogProxyConsumer(ConsumerBase):
             raise TypeError("The 'log_files' argument must be a list of strings.")
         self._log_files = log_files
 
+        if path_label_regex and not re.compile(path_label_regex).groupindex:
+            raise ValueError("The 'path_label_regex' argument must have named groups.")
+        self._path_label_regex = path_label_regex
+        self._pipeline_stages = pipeline_stages or []
+
         self._syslog_port = syslog_port
         self._is_syslog = enable_syslog
         self.topology = JujuTopology.from_charm(charm)
@@ -1854,15 +1935,13 @@ class LogProxyConsumer(ConsumerBase):
                 return
 
             new_config = self._promtail_config
-            if new_config != self._current_config:
-                self._container.push(
-                    WORKLOAD_CONFIG_PATH, yaml.safe_dump(new_config), make_dirs=True
-                )
+            changed = self._push_config_if_changed(new_config)
 
             # Loki may send endpoints late. Don't necessarily start, there may be
             # no clients
             if new_config["clients"]:
-                self._container.restart(WORKLOAD_SERVICE_NAME)
+                if changed or not self._is_promtail_running():
+                    self._container.restart(WORKLOAD_SERVICE_NAME)
                 self.on.log_proxy_endpoint_joined.emit()
             else:
                 self.on.promtail_digest_error.emit("No promtail client endpoints available!")
@@ -1880,11 +1959,11 @@ class LogProxyConsumer(ConsumerBase):
             return
 
         new_config = self._promtail_config
-        if new_config != self._current_config:
-            self._container.push(WORKLOAD_CONFIG_PATH, yaml.safe_dump(new_config), make_dirs=True)
+        changed = self._push_config_if_changed(new_config)
 
         if new_config["clients"]:
-            self._container.restart(WORKLOAD_SERVICE_NAME)
+            if changed or not self._is_promtail_running():
+                self._container.restart(WORKLOAD_SERVICE_NAME)
         else:
             self._container.stop(WORKLOAD_SERVICE_NAME)
         self.on.log_proxy_endpoint_departed.emit()
@@ -1958,7 +2037,7 @@ class LogProxyConsumer(ConsumerBase):
                 WORKLOAD_SERVICE_NAME: {
                     "override": "replace",
                     "summary": WORKLOAD_SERVICE_NAME,
-                    "command": "{} {}".format(workload_binary_path, self._cli_args),
+                    "command": self._promtail_command(workload_binary_path),
                     "startup": "disabled",
                 }
             },
@@ -1967,6 +2046,29 @@ class LogProxyConsumer(ConsumerBase):
             self._container_name, pebble_layer, combine=True  # pyright: ignore
         )
 
+    def _promtail_command(self, workload_binary_path: str) -> str:
+        return "{} {}".format(workload_binary_path, self._cli_args)
+
+    def _is_promtail_running(self) -> bool:
+        service = self._container.get_services(WORKLOAD_SERVICE_NAME).get(WORKLOAD_SERVICE_NAME)
+        return service is not None and service.is_running()
+
+    def _push_config_if_changed(self, new_config: dict) -> bool:
+        """Push the rendered config only if it differs semantically from the workload's.
+
+        Both configs are compared by a hash of their canonical JSON form, so key order
+        and YAML formatting never cause a push (and the restart that follows it).
+
+        Returns:
+            True if the config was pushed.
+        """
+        if _canonical_hash(new_config) == _canonical_hash(self._current_config):
+            logger.debug("Promtail config is unchanged.")
+            return False
+
+        self._container.push(WORKLOAD_CONFIG_PATH, yaml.safe_dump(new_config), make_dirs=True)
+        return True
+
     def _create_directories(self) -> None:
         """Creates the directories for Promtail binary and config file."""
         self._container.make_dir(path=WORKLOAD_BINARY_DIR, make_parents=True)
@@ -2001,15 +2103,22 @@ class LogProxyConsumer(ConsumerBase):
             workload_binary_path: path in workload container to which promtail binary is pushed.
         """
         with open(binary_path, "rb") as f:
+            source = _HashingReader(f)
             self._container.push(
                 workload_binary_path,
-                f,
+                source,  # pyright: ignore
                 permissions=0o755,
                 encoding=None,  # pyright: ignore
                 make_dirs=True,
             )
             logger.debug("The promtail binary file has been pushed to the workload container.")
 
+        # Written last, so a push that failed half way never looks installed.
+        manifest = {"binsha": source.digest.hexdigest(), "size": source.size}
+        self._container.push(
+            _manifest_path(workload_binary_path), json.dumps(manifest), make_dirs=True
+        )
+
     @property
     def _promtail_attached_as_resource(self) -> bool:
         """Checks whether Promtail binary is attached to the charm or not.
@@ -2077,9 +2186,11 @@ class LogProxyConsumer(ConsumerBase):
             a specific sha256sum.
         """
         try:
+            digest = sha256()
             with open(file_path, "rb") as f:
-                file_bytes = f.read()
-                result = sha256(file_bytes).hexdigest()
+                for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                result = digest.hexdigest()
 
                 if result != sha256sum:
                     msg = "File sha256sum mismatch, expected:'{}' but got '{}'".format(
@@ -2132,21 +2243,27 @@ class LogProxyConsumer(ConsumerBase):
         proxy_handler = request.ProxyHandler(proxies)
         opener = request.build_opener(proxy_handler)
 
-        with opener.open(promtail_info["url"]) as r:
-            file_bytes = r.read()
-            file_path = os.path.join(BINARY_DIR, promtail_info["filename"] + ".gz")
-            with open(file_path, "wb") as f:
-                f.write(file_bytes)
-                logger.info(
-                    "Promtail binary zip file has been downloaded and stored in: %s",
-                    file_path,
-                )
+        # Stream the archive: gunzip and hash each chunk straight to disk, so memory use
+        # stays at a few chunks instead of holding both the archive and the binary.
+        binary_path = os.path.join(BINARY_DIR, promtail_info["filename"])
+        binsha = sha256()
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
 
-            decompressed_file = GzipFile(fileobj=BytesIO(file_bytes))
-            binary_path = os.path.join(BINARY_DIR, promtail_info["filename"])
-            with open(binary_path, "wb") as outfile:
-                outfile.write(decompressed_file.read())
-                logger.debug("Promtail binary file has been downloaded.")
+        with opener.open(promtail_info["url"]) as r, open(binary_path, "wb") as outfile:
+            for chunk in iter(lambda: r.read(DOWNLOAD_CHUNK_SIZE), b""):
+                data = decompressor.decompress(chunk)
+                binsha.update(data)
+                outfile.write(data)
+
+            data = decompressor.flush()
+            binsha.update(data)
+            outfile.write(data)
+            logger.debug("Promtail binary file has been downloaded.")
+
+        expected = promtail_info.get("binsha")
+        if expected and binsha.hexdigest() != expected:
+            os.remove(binary_path)
+            raise PromtailChecksumError(expected, binsha.hexdigest())
 
         workload_binary_path = os.path.join(WORKLOAD_BINARY_DIR, promtail_info["filename"])
         self._push_binary_to_workload(binary_path, workload_binary_path)
@@ -2254,6 +2371,10 @@ class LogProxyConsumer(ConsumerBase):
             "job_name": "system",
             "static_configs": self._generate_static_configs(config),
         }
+        pipeline_stages = self._path_label_stages() if self._path_label_regex else []
+        pipeline_stages += self._pipeline_stages
+        if pipeline_stages:
+            scrape_config["pipeline_stages"] = pipeline_stages
         scrape_configs.append(scrape_config)
 
         # Syslog config
@@ -2288,17 +2409,36 @@ class LogProxyConsumer(ConsumerBase):
     def _generate_static_configs(self, config: dict) -> list:
         """Generates static_configs section.
 
+        Promtail expands `__path__` as a doublestar glob, so every log file and pattern
+        is folded into one `{a,b,...}` alternation instead of one config per file.
+
         Returns:
             - a list of dictionaries representing static_configs section
         """
-        static_configs = []
+        if not self._log_files:
+            return []
 
-        for _file in self._log_files:
-            conf = deepcopy(config)
-            conf["labels"]["__path__"] = _file
-            static_configs.append(conf)
+        paths = list(dict.fromkeys(self._log_files))
+        conf = deepcopy(config)
+        conf["labels"]["__path__"] = (
+            paths[0] if len(paths) == 1 else "{{{}}}".format(",".join(paths))
+        )
+        return [conf]
 
-        return static_configs
+    def _path_label_stages(self) -> list:
+        """Generates pipeline stages that label each line from its file's path.
+
+        Promtail seeds the extracted data with the target labels, so the `filename`
+        label of the tailed file is available as a regex source.
+
+        Returns:
+            - a list of dictionaries representing pipeline_stages section
+        """
+        groups = re.compile(cast(str, self._path_label_regex)).groupindex
+        return [
+            {"regex": {"source": "filename", "expression": self._path_label_regex}},
+            {"labels": {group: None for group in groups}},
+        ]
 
     def _setup_promtail(self) -> None:
         # Use the first
@@ -2319,7 +2459,7 @@ class LogProxyConsumer(ConsumerBase):
         if not self._is_promtail_installed(promtail_binaries[self._arch]):
             try:
                 self._obtain_promtail(promtail_binaries[self._arch])
-            except HTTPError as e:
+            except (HTTPError, PromtailChecksumError) as e:
                 msg = "Promtail binary couldn't be downloaded - {}".format(str(e))
                 logger.warning(msg)
                 self.on.promtail_digest_error.emit(msg)
@@ -2330,15 +2470,18 @@ class LogProxyConsumer(ConsumerBase):
         )
 
         self._create_directories()
-        self._container.push(
-            WORKLOAD_CONFIG_PATH, yaml.safe_dump(self._promtail_config), make_dirs=True
-        )
+        new_config = self._promtail_config
+        changed = self._push_config_if_changed(new_config)
 
-        self._add_pebble_layer(workload_binary_path)
+        service = self._container.get_plan().services.get(WORKLOAD_SERVICE_NAME)
+        if service is None or service.command != self._promtail_command(workload_binary_path):
+            self._add_pebble_layer(workload_binary_path)
+            changed = True
 
-        if self._current_config.get("clients"):
+        if new_config["clients"]:
             try:
-                self._container.restart(WORKLOAD_SERVICE_NAME)
+                if changed or not self._is_promtail_running():
+                    self._container.restart(WORKLOAD_SERVICE_NAME)
             except ChangeError as e:
                 self.on.promtail_digest_error.emit(str(e))
             else:
@@ -2349,15 +2492,31 @@ class LogProxyConsumer(ConsumerBase):
     def _is_promtail_installed(self, promtail_info: dict) -> bool:
         """Determine if promtail has already been installed to the container.
 
+        The install manifest pushed next to the binary records its sha256sum and size,
+        so this costs one stat and one small read instead of hashing the binary.
+        A binary attached as a resource has no expected sha256sum; only its size is checked.
+
         Args:
             promtail_info: dictionary containing information about promtail binary
                that must be used. The dictionary must at least contain a key
-               "filename" giving the name of promtail binary
+               "filename" giving the name of promtail binary, and should contain
+               "binsha", the sha256 sum of the unpacked binary
         """
         workload_binary_path = "{}/{}".format(WORKLOAD_BINARY_DIR, promtail_info["filename"])
         try:
-            self._container.list_files(workload_binary_path)
-        except (APIError, FileNotFoundError):
+            (binary,) = self._container.list_files(workload_binary_path, itself=True)
+            manifest = json.loads(
+                self._container.pull(_manifest_path(workload_binary_path)).read()
+            )
+        except (APIError, PathError, FileNotFoundError, ValueError):
+            return False
+
+        expected = None if self._promtail_attached_as_resource else promtail_info.get("binsha")
+        if expected and manifest.get("binsha") != expected:
+            logger.debug("Installed promtail is not the expected version.")
+            return False
+        if manifest.get("size") != binary.size:
+            logger.debug("Installed promtail does not match its install manifest.")
             return False
         return True
 
@@ -2382,6 +2541,29 @@ class LogProxyConsumer(ConsumerBase):
         )
 
 
+class _HashingReader:
+    """File wrapper that hashes and counts the bytes read through it."""
+
+    def __init__(self, f: typing.BinaryIO):
+        self._f = f
+        self.digest = sha256()
+        self.size = 0
+
+    def read(self, n: int = -1) -> bytes:
+        data = self._f.read(n)
+        self.digest.update(data)
+        self.size += len(data)
+        return data
+
+
+def _canonical_hash(config: dict) -> str:
+    return sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+
+def _manifest_path(workload_binary_path: str) -> str:
+    return "{}.manifest.json".format(workload_binary_path)
+
+
 class CosTool:
     """Uses cos-tool to inject label matchers into alert rule expressions and validate rules."""
 
@@ -2,37 +2,95 @@
 # Copyright 2024 Tim Holmes-Mitra <tim.holmes-mitra@canonical.com>
 # See LICENSE file for licensing details.
 
+import hashlib
+import json
 import logging
-from typing import TYPE_CHECKING
+import os
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional, Union
 
 import ops
-from utils import get_or_fail, stringify
-from workload import WorkloadAgentBuilder, WorkloadAgentBuilderState
+
+import loadtest
+import logrotate
+import profiling
+import scaling
+from client import WorkloadClient
+from compute import ComputeResourcesError, ComputeResourcesPatch
+from entities import ComputeResources, GoRuntime, LoggingMode, WorkloadEnv
+from metrics import ClientTimings, HandlerTimings, timed
+from utils import get_or_fail, import_report, stringify, timed_import
+from workload import WorkloadAgent, WorkloadAgentBuilder, WorkloadAgentBuilderState
 
 if TYPE_CHECKING:  # development import paths for type checking
     from lib.charms.data_platform_libs.v0.data_interfaces import DatabaseRequires
     from lib.charms.grafana_k8s.v0.grafana_dashboard import GrafanaDashboardProvider
-    from lib.charms.loki_k8s.v0.loki_push_api import LogProxyConsumer
+    from lib.charms.loki_k8s.v0.loki_push_api import LogProxyConsumer, LokiPushApiConsumer
     from lib.charms.prometheus_k8s.v0.prometheus_scrape import MetricsEndpointProvider
     from lib.charms.traefik_route_k8s.v0.traefik_route import TraefikRouteRequirer
 
-else:  # runtime import paths
-    from charms.data_platform_libs.v0.data_interfaces import DatabaseRequires  # noqa: F401, I001
-    from charms.grafana_k8s.v0.grafana_dashboard import GrafanaDashboardProvider  # noqa: F401, I001
-    from charms.loki_k8s.v0.loki_push_api import LogProxyConsumer  # noqa: F401, I001
-    from charms.prometheus_k8s.v0.prometheus_scrape import MetricsEndpointProvider  # noqa: F401, I001
-    from charms.traefik_route_k8s.v0.traefik_route import TraefikRouteRequirer  # noqa: F401, I001
+else:  # runtime import paths; observability libs load lazily in _configure_observability
+    DatabaseRequires = timed_import(
+        "charms.data_platform_libs.v0.data_interfaces"
+    ).DatabaseRequires
+    TraefikRouteRequirer = timed_import(
+        "charms.traefik_route_k8s.v0.traefik_route"
+    ).TraefikRouteRequirer
 
 logger = logging.getLogger(__name__)
 
+VERSION_PROBE_BACKOFF = 60
+VERSION_PROBE_BACKOFF_MAX = 3600
+# First Juju whose Pebble forwards logs to Loki with labels
+LOG_FORWARDING_JUJU_VERSION = "3.4"
+
 
 class UbuntuMetrics(ops.CharmBase):
+    _stored = ops.StoredState()
+
     def __init__(self, *args) -> None:
         super().__init__(*args)
+        self._stored.set_default(
+            workload_fingerprint="",
+            version_image="",
+            version_probe_failures=0,
+            version_probe_not_before=0.0,
+            container_limits={},
+            handler_timings={},
+            client_timings={},
+            builder_snapshot="",
+            profile_dispatches=0,
+            log_target_names=[],
+            log_rotated_at=0.0,
+            charm_metrics_fingerprint="",
+            compute_resources_managed=False,
+        )
+        self._timings = HandlerTimings(self._stored.handler_timings)  # type: ignore
+        self._client_timings = ClientTimings(self._stored.client_timings)  # type: ignore
+
+        self._reconcile_requested = False
+        self._reconcile_count = 0
 
         builder = WorkloadAgentBuilder()
+        builder.set_log_forwarding_supported(
+            self.model.juju_version >= LOG_FORWARDING_JUJU_VERSION
+        )
         builder.load_config_values(self.config)
 
+        builder.set_unit_index(int(self.unit.name.split("/")[-1]))
+        builder.set_log_labels(
+            {
+                "juju_model": self.model.name,
+                "juju_model_uuid": self.model.uuid,
+                "juju_application": self.app.name,
+                "juju_unit": self.unit.name,
+                "juju_charm": self.meta.name,
+            }
+        )
+        builder.set_log_target_names(list(self._stored.log_target_names))  # type: ignore
+        self._builder_restored = builder.restore(self._stored.builder_snapshot)  # type: ignore
+
         self._builder = builder
         self._container: ops.Container = self.unit.get_container("workload")
 
@@ -53,114 +111,646 @@ class UbuntuMetrics(ops.CharmBase):
         self._register_events()
 
     def _configure_observability(self) -> None:
-        """Observability is non-blocking."""
+        """Observability is non-blocking.
+
+        Each library is only imported and instantiated when its relation exists or this
+        dispatch is one of its relation hooks, which keeps most hooks from loading ~7k lines.
+        """
         builder = self._builder
         port = builder.port
 
-        self._prometheus_scraping = MetricsEndpointProvider(
-            self,
-            relation_name=builder.metrics_relation_name,
-            jobs=[{"static_configs": [{"targets": [f"*:{port}"]}]}],
-            refresh_event=self.on.config_changed,
-        )
+        self._prometheus_scraping: Optional["MetricsEndpointProvider"] = None
+        self._logging: Optional[Union["LogProxyConsumer", "LokiPushApiConsumer"]] = None
+        self._grafana_dashboards: Optional["GrafanaDashboardProvider"] = None
+
+        if self._is_related(builder.metrics_relation_name):
+            lib = timed_import("charms.prometheus_k8s.v0.prometheus_scrape")
+            jobs: list[dict] = [{"static_configs": [{"targets": [f"*:{port}"]}]}]
+            if builder.charm_metrics_port:
+                jobs.append(
+                    {
+                        "job_name": "charm",
+                        "metrics_path": f"/{Path(builder.charm_metrics_file).name}",
+                        "static_configs": [{"targets": [f"*:{builder.charm_metrics_port}"]}],
+                    }
+                )
+
+            self._prometheus_scraping = lib.MetricsEndpointProvider(
+                self,
+                relation_name=builder.metrics_relation_name,
+                jobs=jobs,
+                refresh_event=self.on.config_changed,
+            )
 
-        self._logging = LogProxyConsumer(
-            self,
-            relation_name=builder.log_relation_name,
-            log_files=[builder.log_file],
-        )
+        if self._is_related(builder.log_relation_name):
+            lib = timed_import("charms.loki_k8s.v0.loki_push_api")
+            if builder.logging_mode == LoggingMode.Pebble:
+                # Pebble forwards the workload's output itself; only the endpoints are needed.
+                self._logging = lib.LokiPushApiConsumer(
+                    self, relation_name=builder.log_relation_name
+                )
+            else:
+                self._logging = lib.LogProxyConsumer(
+                    self,
+                    relation_name=builder.log_relation_name,
+                    log_files=builder.log_files,
+                    path_label_regex=builder.log_path_label_regex,
+                    pipeline_stages=self._log_pipeline_stages(lib),
+                )
+
+        if self._is_related(builder.grafana_relation_name):
+            lib = timed_import("charms.grafana_k8s.v0.grafana_dashboard")
+            self._grafana_dashboards = lib.GrafanaDashboardProvider(
+                self, relation_name=builder.grafana_relation_name
+            )
 
-        self._grafana_dashboards = GrafanaDashboardProvider(
-            self, relation_name=builder.grafana_relation_name
+    def _log_pipeline_stages(self, lib) -> list[dict]:
+        pipeline = self._builder.log_pipeline
+        return lib.promtail_pipeline_stages(
+            log_format=pipeline.log_format, drop_levels=list(pipeline.drop_levels)
         )
 
+    def _is_related(self, relation_name: str) -> bool:
+        """Whether this dispatch may touch the relation, including its own relation-broken."""
+        if os.environ.get("JUJU_RELATION") == relation_name:
+            return True
+
+        return len(self.model.relations[relation_name]) > 0
+
     def _register_events(self) -> None:
         observe = self.framework.observe
 
         observe(self.on.config_changed, self._on_config_changed)
 
-        observe(self.on.workload_pebble_ready, self._try_start)
+        observe(self.on.workload_pebble_ready, self._on_workload_pebble_ready)
 
-        observe(self._db.on.database_created, self._try_start)
-        observe(self._db.on.endpoints_changed, self._try_start)
+        observe(self._db.on.database_created, self._on_database_changed)
+        observe(self._db.on.endpoints_changed, self._on_database_changed)
+        observe(self._db.on.read_only_endpoints_changed, self._on_database_changed)
         observe(self.on.database_relation_broken, self._on_db_relation_broken)
 
-        observe(self.on.ingress_relation_joined, self._try_start)
-        observe(self._ingress.on.ready, self._try_start)
-        observe(self.on.leader_elected, self._try_start)
-        observe(self.on.config_changed, self._try_start)
+        observe(self.on.ingress_relation_joined, self._on_ingress_relation_joined)
+        observe(self._ingress.on.ready, self._request_reconcile)
+        observe(self.on.leader_elected, self._on_reconcile_invalidated)
+
+        peers = self.on[self._builder.peer_relation_name]
+        observe(peers.relation_created, self._on_unit_address_changed)
+        observe(peers.relation_changed, self._on_peers_changed)
+        observe(peers.relation_departed, self._on_peers_changed)
+
+        logging = self.on[self._builder.log_relation_name]
+        observe(logging.relation_changed, self._on_loki_endpoints_changed)
+        observe(logging.relation_departed, self._on_loki_endpoints_changed)
+        observe(logging.relation_broken, self._on_loki_endpoints_changed)
 
+        observe(self.on.upgrade_charm, self._on_upgrade_charm)
+
+        observe(self.on.update_status, self._on_update_status)
+
+        observe(self.on.get_profiles_action, self._on_get_profiles_action)
+        observe(self.on.scaling_advice_action, self._on_scaling_advice_action)
+        observe(self.on.load_test_action, self._on_load_test_action)
+
+        observe(self.framework.on.pre_commit, self._on_pre_commit)
+
+    @timed
     def _on_config_changed(self, event: ops.ConfigChangedEvent):
         env = self.config.get("env")
 
+        self._try_arm_profiling()
+
         if not env:
             self.unit.status = ops.BlockedStatus("Charm's env unset. Must be prod, stg, or local")
             return
 
         logger.info(f"Environment set to: {env}")
-        self._builder.set_env(env)
-        self._try_start(event)
+        self._builder.set_env(str(env))
+        self._request_reconcile(event)
 
-    def _try_start(self, event: ops.EventBase) -> None:
-        self.unit.status = ops.WaitingStatus("Trying to start workload")
+    def _try_arm_profiling(self) -> None:
+        """Re-arm only when the option changes, so unrelated config changes keep the count."""
+        dispatches = int(self.config.get("profile_dispatches", 0))
+        if dispatches == self._stored.profile_dispatches:
+            return
+
+        logger.info(f"Profiling the next {dispatches} dispatch(es)")
+        profiling.arm(dispatches)
+        self._stored.profile_dispatches = dispatches
+
+    def _on_get_profiles_action(self, event: ops.ActionEvent) -> None:
+        top = int(event.params.get("top", 20))
+        sort = str(event.params.get("sort", "cumulative"))
+
+        try:
+            summary = profiling.summarize(top, sort)
+        except KeyError:
+            event.fail(f"Unknown sort key: {sort}")
+            return
+
+        event.set_results({"profiles": len(profiling.profiles()), "summary": summary})
+
+    def _on_scaling_advice_action(self, event: ops.ActionEvent) -> None:
+        builder = self._builder
+        addresses = builder.unit_addresses or ["localhost"]
+        window = float(event.params.get("window", 30))
+        target_rps_per_unit = float(self.config.get("scaling_target_rps_per_unit", 50))
+
+        if target_rps_per_unit <= 0:
+            event.fail("scaling_target_rps_per_unit must be greater than 0")
+            return
+
+        event.log(f"Sampling {len(addresses)} unit(s) over {window}s")
+        advice = scaling.advise(
+            addresses,
+            builder.port,
+            window,
+            target_rps_per_unit=target_rps_per_unit,
+            max_error_ratio=float(self.config.get("scaling_max_error_ratio", 0.01)),
+        )
 
+        units = {
+            load.address: f"rate={load.request_rate:.2f}/s errors={load.error_ratio:.2%} saturation={load.saturation:.0%}"
+            for load in advice.units
+        }
+        results = {
+            "current-units": advice.current_units,
+            "recommended-units": advice.recommended_units,
+            "request-rate": f"{advice.request_rate:.2f}",
+            "error-ratio": f"{advice.error_ratio:.4f}",
+            "units": json.dumps(units),
+            "unreachable": ",".join(advice.unreachable),
+        }
+        if advice.unreachable:
+            results["note"] = (
+                f"{len(advice.unreachable)} unreachable unit(s) count in current-units but add "
+                "nothing to request-rate, so recommended-units may be low"
+            )
+        event.set_results(results)
+
+    def _on_load_test_action(self, event: ops.ActionEvent) -> None:
         if not self._container.can_connect():
-            self.unit.status = ops.WaitingStatus("Cannot connect to container")
+            event.fail("Cannot connect to the workload container")
+            return
+
+        workload_agent = self._try_build_workload_agent()
+        if workload_agent is None:
+            event.fail("Workload is not ready")
+            return
+
+        params = event.params
+        base_url = workload_agent.api_url()
+
+        if params.get("target", "local") == "ingress":
+            if workload_agent.env == WorkloadEnv.Prod:
+                event.fail("Load testing through ingress is not allowed in prod")
+                return
+            scheme = self._ingress.scheme or "http"
+            base_url = f"{scheme}://{workload_agent.external_hostname}"
+
+        template = loadtest.RequestTemplate(
+            method=str(params.get("method", "GET")).upper(),
+            path=str(params.get("path", "about")),
+            body=params.get("body") or None,
+            content_type=str(params.get("content-type", "application/json")),
+        )
+
+        event.log(f"Running {template.method} {base_url}/{template.path}")
+        try:
+            report = loadtest.run(
+                base_url,
+                template,
+                concurrency=int(params.get("concurrency", 4)),
+                duration=float(params.get("duration", 10)),
+                max_requests=int(params.get("max-requests", 100_000)),
+            )
+        except Exception as e:
+            logger.error(f"Load test failed: {e}")
+            event.fail(f"Load test failed: {e}")
+            return
+
+        # Cumulative like Prometheus buckets, so le-inf is the total
+        histogram = report.histogram
+        buckets, cumulative = {}, 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            buckets[f"le-{bound}s"] = cumulative
+        buckets["le-inf"] = histogram.count
+
+        event.set_results(
+            {
+                "requests": report.requests,
+                "errors": report.errors,
+                "throughput": f"{report.throughput:.1f}",
+                "p50-ms": f"{report.percentile(0.50) * 1000:.1f}",
+                "p95-ms": f"{report.percentile(0.95) * 1000:.1f}",
+                "p99-ms": f"{report.percentile(0.99) * 1000:.1f}",
+                "histogram": json.dumps(buckets),
+            }
+        )
+
+    def _on_ingress_relation_joined(self, event: ops.RelationJoinedEvent) -> None:
+        # When self._ingress._relation is first set in __init__ it too early in
+        # the charm's life. So, when we capture the relation from the event.
+        self._ingress._relation = event.relation
+        self._on_reconcile_invalidated(event)
+
+    def _on_workload_pebble_ready(self, event: ops.PebbleReadyEvent) -> None:
+        """Reset per-pod state; a restarted pod has a fresh plan, address and resource limits."""
+        self._stored.container_limits = {}
+        self._stored.log_target_names = []
+        self._stored.charm_metrics_fingerprint = ""
+        self._builder.set_log_target_names([])
+        self._on_unit_address_changed(event)
+        self._on_reconcile_invalidated(event)
+
+    def _on_unit_address_changed(self, event: ops.EventBase) -> None:
+        """Publish this unit's address so the leader can route to it directly."""
+        relation = self.model.get_relation(self._builder.peer_relation_name)
+        if relation is None:
+            return
+
+        try:
+            binding = self.model.get_binding(relation)
+            address = binding.network.ingress_address if binding else None
+        except ops.ModelError as e:
+            logger.warning(f"Failed to resolve unit address: {e}")
             return
 
+        if address is None:
+            return
+
+        databag = relation.data[self.unit]
+        if databag.get("address") != str(address):
+            databag["address"] = str(address)
+            self._on_peers_changed(event)
+
+    def _on_peers_changed(self, event: ops.EventBase) -> None:
+        self._try_fetch_unit_addresses()
+        self._builder.set_unit_count(self.app.planned_units())
+        self._request_reconcile(event)
+
+    def _on_database_changed(self, event: ops.EventBase) -> None:
         self._try_fetch_db_relation()
-        self._try_configure_ingress(event)
+        self._request_reconcile(event)
+
+    def _on_loki_endpoints_changed(self, event: ops.RelationEvent) -> None:
+        self._try_fetch_loki_endpoints()
+        self._request_reconcile(event)
+
+    def _on_upgrade_charm(self, event: ops.UpgradeCharmEvent) -> None:
+        self._refresh_builder()
+        self._on_reconcile_invalidated(event)
 
+    def _refresh_builder(self) -> None:
+        """Re-read every relation into the builder, for when no usable snapshot exists."""
+        self._try_fetch_db_relation()
+        self._try_fetch_unit_addresses()
+        self._try_fetch_loki_endpoints()
+        self._builder.set_unit_count(self.app.planned_units())
+        self._builder_restored = True
+
+    def _on_reconcile_invalidated(self, event: ops.EventBase) -> None:
+        """Forget the fingerprint; the container plan or ingress databag may have been reset."""
+        self._stored.workload_fingerprint = ""
+        self._request_reconcile(event)
+
+    def _request_reconcile(self, _: ops.EventBase) -> None:
+        """Handlers only mark the charm dirty; the reconcile itself runs once per dispatch."""
+        self._reconcile_requested = True
+
+    def _on_pre_commit(self, _: ops.EventBase) -> None:
+        if self._reconcile_requested:
+            self._reconcile_requested = False
+            self._reconcile_count += 1
+            self._try_start()
+
+        if self._builder.logging_mode_refused:
+            self.unit.status = ops.BlockedStatus(
+                f"logging_mode=pebble needs Juju >= {LOG_FORWARDING_JUJU_VERSION}"
+            )
+
+        self._stored.builder_snapshot = self._builder.snapshot()
+
+        hook = os.environ.get("JUJU_DISPATCH_PATH", "unknown")
+        logger.debug(f"{hook} ran {self._reconcile_count} reconcile(s), {import_report()}")
+
+        self._try_publish_timings()
+
+    def _try_publish_timings(self) -> None:
+        """Push cumulative handler and API request timings as a Prometheus textfile."""
         builder = self._builder
-        builder_state = builder.get_state()
+        if not builder.charm_metrics_port:
+            return
 
-        if not builder_state == WorkloadAgentBuilderState.Ready:
-            self.unit.status = ops.WaitingStatus(builder_state.name)
-            logger.debug(stringify(builder))
+        self._client_timings.collect(WorkloadClient.shared_clients())
+        self._stored.handler_timings = self._timings.snapshot()
+        self._stored.client_timings = self._client_timings.snapshot()
+
+        metrics = self._timings.to_prometheus() + self._client_timings.to_prometheus()
+        try:
+            self._container.push(builder.charm_metrics_file, metrics, make_dirs=True)
+        except ops.pebble.Error as e:
+            logger.debug(f"Failed to push charm metrics: {e}")
+
+    def _try_serve_charm_metrics(self, workload_agent: WorkloadAgent) -> None:
+        """Start or stop the timings server; its failures are logged, never fatal to the unit."""
+        service = workload_agent.charm_metrics_service
+        fingerprint = ""
+        if workload_agent.charm_metrics_port:
+            layer = workload_agent.create_charm_metrics_layer.to_dict()
+            fingerprint = hashlib.sha256(json.dumps(layer, sort_keys=True).encode()).hexdigest()
+
+        if fingerprint == self._stored.charm_metrics_fingerprint:
             return
 
-        workload_agent = builder.build()
+        # Recorded before trying, so an image without python3 is not retried on every hook.
+        self._stored.charm_metrics_fingerprint = fingerprint
+
+        try:
+            if not fingerprint:
+                self._container.stop(service)
+                return
+
+            self._container.add_layer(
+                service, workload_agent.create_charm_metrics_layer, combine=True
+            )
+            self._container.restart(service)
+        except (ops.pebble.Error, ops.ModelError) as e:
+            logger.warning(f"Failed to serve charm metrics on the workload container: {e}")
+
+    @timed
+    def _try_start(self) -> None:
+        self.unit.status = ops.WaitingStatus("Trying to start workload")
+
+        if not self._container.can_connect():
+            self.unit.status = ops.WaitingStatus("Cannot connect to container")
+            return
+
+        workload_agent = self._try_build_workload_agent()
+        if workload_agent is None:
+            return
+
+        self._try_serve_charm_metrics(workload_agent)
+        if self._builder.logging_mode == LoggingMode.Pebble:
+            self._try_stop_promtail()
+
+        fingerprint = workload_agent.fingerprint
+
+        if fingerprint == self._stored.workload_fingerprint:
+            logger.debug(f"Workload unchanged ({fingerprint[:12]}), skipping replan")
+            self.unit.status = ops.ActiveStatus("🚀")
+            return
 
         try:
-            ingress_config = workload_agent.create_ingress_config
-            self._ingress.submit_to_traefik(ingress_config)
+            if workload_agent.ingress_ready:
+                self._ingress.submit_to_traefik(workload_agent.create_ingress_config)
 
             layer = workload_agent.create_pebble_layer
             self._container.add_layer(workload_agent.name, layer, combine=True)
             self._container.replan()
+            self._stored.log_target_names = sorted(layer.log_targets)
+            self._builder.set_log_target_names(sorted(layer.log_targets))
             self.unit.open_port(protocol="tcp", port=workload_agent.port)
 
-            version = workload_agent.fetch_version()
-            self.unit.set_workload_version(version)
+            if not self._try_apply_compute_resources(workload_agent.compute_resources):
+                self.unit.status = ops.WaitingStatus("Resource limits pending rollout")
+                return
 
+            self._stored.workload_fingerprint = fingerprint
             self.unit.status = ops.ActiveStatus("🚀")
 
         except ops.pebble.ConnectionError as e:
             logger.error(f"Failed to connect to Pebble: {e}")
             self.unit.status = ops.BlockedStatus("Could not connect to container")
 
+        except ComputeResourcesError as e:
+            logger.error(e)
+            self.unit.status = ops.BlockedStatus("Failed to apply resource limits, is it trusted?")
+
         except Exception as e:
             logger.error(f"Pebble replan failed: {e}")
             self.unit.status = ops.BlockedStatus("Failed to configure container")
 
-    def _try_configure_ingress(self, event: ops.EventBase) -> None:
-        if not self.unit.is_leader():
+    def _try_stop_promtail(self) -> None:
+        """Stop a promtail left from promtail mode, or Pebble and it would ship every line twice.
+
+        Its layer has startup disabled, so replan never brings it back; switching back to
+        promtail mode lets LogProxyConsumer start it again.
+        """
+        try:
+            service = self._container.get_services("promtail").get("promtail")
+            if service is not None and service.is_running():
+                self._container.stop(service.name)
+                logger.info("Stopped promtail, Pebble forwards the workload's logs")
+        except ops.pebble.Error as e:
+            logger.warning(f"Failed to stop promtail: {e}")
+
+    def _try_apply_compute_resources(self, resources: ComputeResources) -> bool:
+        """Patch the StatefulSet as leader; True once this unit's pod runs with the resources."""
+        if resources.is_empty and not self._stored.compute_resources_managed:
+            return True
+
+        patch = ComputeResourcesPatch(self.model.name, self.app.name, self._container.name)
+
+        if self.unit.is_leader():
+            patch.apply(resources)
+
+        if not patch.is_rolled_out(self.unit.name.replace("/", "-"), resources):
+            return False
+
+        # Once cleared resources have rolled out there is nothing left to remove.
+        self._stored.compute_resources_managed = not resources.is_empty
+        return True
+
+    @timed
+    def _try_build_workload_agent(self) -> Optional[WorkloadAgent]:
+        if not self._builder_restored:
+            self._refresh_builder()
+
+        self._try_configure_ingress()
+        self._try_fetch_container_limits()
+
+        builder = self._builder
+        builder_state = builder.get_state()
+
+        if builder_state == WorkloadAgentBuilderState.Ready and builder.db_password is None:
+            self._try_fetch_db_password()
+            if builder.db_password is None:
+                builder_state = WorkloadAgentBuilderState.DatabaseNotReady
+
+        if not builder_state == WorkloadAgentBuilderState.Ready:
+            self.unit.status = ops.WaitingStatus(builder_state.name)
+            logger.debug(stringify(builder))
+            return None
+
+        return builder.build()
+
+    @timed
+    def _on_update_status(self, _: ops.UpdateStatusEvent) -> None:
+        """Rotate logs and probe the workload version here, off the reconcile path."""
+        if not self._stored.workload_fingerprint or not self._container.can_connect():
             return
 
-        # When self._ingress._relation is first set in __init__ it too early in
-        # the charm's life. So, when we capture the relation from the event.
-        if (
-            isinstance(event, ops.RelationJoinedEvent)
-            and event.relation.name == self._builder.ingress_relation_name
-        ):
-            self._ingress._relation = event.relation
+        self._try_rotate_logs()
+        self._try_probe_version()
+
+    def _try_rotate_logs(self) -> None:
+        builder = self._builder
+        rotation = builder.log_rotation
+        if not rotation.is_enabled:
+            return
+
+        now = time.time()
+        if not self._stored.log_rotated_at:
+            self._stored.log_rotated_at = now
+
+        try:
+            (log,) = self._container.list_files(builder.log_file, itself=True)
+        except ops.pebble.APIError:
+            return
+
+        if log.size is None or not rotation.is_due(log.size, self._stored.log_rotated_at, now):
+            return
+
+        stopped = None
+        try:
+            # Only a promtail that is tailing the log shares its positions file with the rotation.
+            positions_path = None
+            if builder.logging_mode == LoggingMode.Promtail and self._logging is not None:
+                service = self._container.get_services("promtail").get("promtail")
+                if service is not None and service.is_running():
+                    positions_path = timed_import(
+                        "charms.loki_k8s.v0.loki_push_api"
+                    ).WORKLOAD_POSITIONS_PATH
+                    self._container.stop(service.name)
+                    stopped = service.name
+
+            logrotate.rotate(self._container, builder.log_file, rotation.keep, positions_path)
+            self._stored.log_rotated_at = now
+            logger.info(f"Rotated {builder.log_file} at {log.size} bytes")
+        except ops.pebble.Error as e:
+            logger.warning(f"Failed to rotate {builder.log_file}: {e}")
+        finally:
+            if stopped is not None:
+                try:
+                    self._container.start(stopped)
+                except ops.pebble.Error as e:
+                    logger.warning(f"Failed to restart {stopped} after rotation: {e}")
+
+    def _try_probe_version(self) -> None:
+        image = self._workload_image_digest()
+        if image == self._stored.version_image:
+            return
+
+        now = time.time()
+        if now < self._stored.version_probe_not_before:
+            return
+
+        workload_agent = self._try_build_workload_agent()
+        if workload_agent is None:
+            return
+
+        version = workload_agent.probe_version()
+
+        if version is None:
+            failures = self._stored.version_probe_failures + 1
+            backoff = min(VERSION_PROBE_BACKOFF * 2 ** (failures - 1), VERSION_PROBE_BACKOFF_MAX)
+            logger.info(f"Version probe failed {failures} time(s), next attempt in {backoff}s")
+            self._stored.version_probe_failures = failures
+            self._stored.version_probe_not_before = now + backoff
+            return
+
+        self.unit.set_workload_version(version)
+        self._stored.version_image = image
+        self._stored.version_probe_failures = 0
+        self._stored.version_probe_not_before = 0.0
+
+    def _workload_image_digest(self) -> str:
+        """Digest of the oci-image resource descriptor, which pins the workload's image."""
+        try:
+            descriptor = self.model.resources.fetch("image").read_bytes()
+        except (NameError, ops.ModelError) as e:
+            logger.debug(f"Image resource unavailable: {e}")
+            return "unknown"
+
+        return hashlib.sha256(descriptor).hexdigest()
+
+    @timed
+    def _try_configure_ingress(self) -> None:
+        # Only the leader writes the app databag; every other unit just serves as a backend.
+        # Leadership can be lost without an event, so this is checked on every reconcile.
+        if not self.unit.is_leader():
+            self._builder.set_ingress_ready(False)
+            return
 
         self._builder.set_ingress_ready(self._ingress.is_ready())
 
+    def _try_fetch_unit_addresses(self) -> None:
+        relation = self.model.get_relation(self._builder.peer_relation_name)
+        if relation is None:
+            return
+
+        units = {self.unit, *relation.units}
+        addresses = [relation.data[unit].get("address") for unit in units]
+        self._builder.set_unit_addresses([address for address in addresses if address])
+
+    def _try_fetch_loki_endpoints(self) -> None:
+        """Read the Loki push urls that each Loki unit publishes in its unit databag."""
+        urls = []
+        for relation in self.model.relations[self._builder.log_relation_name]:
+            for unit in relation.units:
+                endpoint = relation.data[unit].get("endpoint")
+                if endpoint:
+                    urls.append(json.loads(endpoint)["url"])
+
+        self._builder.set_loki_endpoints(sorted(urls))
+
+    def _try_fetch_container_limits(self) -> None:
+        """Read the workload's cgroup limits once per pod; they only change on restart."""
+        limits = self._stored.container_limits
+
+        if not limits:
+            try:
+                cpu_max = self._try_pull("/sys/fs/cgroup/cpu.max")
+                memory_max = self._try_pull("/sys/fs/cgroup/memory.max")
+
+                if cpu_max is None:  # cgroup v1
+                    quota = self._try_pull("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")
+                    period = self._try_pull("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+                    if quota and period:
+                        cpu_max = f"{'max' if quota == '-1' else quota} {period}"
+
+                if memory_max is None:  # cgroup v1
+                    memory_max = self._try_pull("/sys/fs/cgroup/memory/memory.limit_in_bytes")
+            except ops.pebble.ConnectionError as e:
+                # Not cached: an unreachable Pebble says nothing about the pod's limits.
+                logger.debug(f"Failed to read container limits: {e}")
+                self._builder.set_container_limits(None, None)
+                return
+
+            limits = {
+                "cpus": GoRuntime.parse_cpu_max(cpu_max),
+                "memory_bytes": GoRuntime.parse_memory_max(memory_max),
+            }
+            self._stored.container_limits = limits
+
+        self._builder.set_container_limits(limits["cpus"], limits["memory_bytes"])
+
+    def _try_pull(self, path: str) -> Optional[str]:
+        """Read a file from the workload; a missing file is None, a lost Pebble raises."""
+        try:
+            return self._container.pull(path).read().strip()
+        except ops.pebble.ConnectionError:
+            raise
+        except ops.pebble.Error as e:
+            logger.debug(f"Failed to read {path}: {e}")
+            return None
+
+    @timed
     def _try_fetch_db_relation(self) -> None:
         relations = self._db.fetch_relation_data()
 
-        for data in relations.values():
+        for relation_id, data in relations.items():
             if not data:
                 continue
 
@@ -170,11 +760,27 @@ class UbuntuMetrics(ops.CharmBase):
                 .set_db_port(int(port))
                 .set_db_username(data["username"])
                 .set_db_password(data["password"])
+                .set_db_relation_id(relation_id)
             )
 
+            read_only = data.get("read-only-endpoints", "")
+            self._builder.set_db_read_endpoints([e for e in read_only.split(",") if e])
+
+    def _try_fetch_db_password(self) -> None:
+        relation_id = self._builder.db_relation_id
+        if relation_id is None:
+            return
+
+        password = self._db.fetch_relation_field(relation_id, "password")
+        if password:
+            self._builder.set_db_password(password)
+
     def _on_db_relation_broken(self, _: ops.EventBase | None = None) -> None:
+        self._builder.clear_db()
         self.unit.status = ops.WaitingStatus("Db relation broken")
 
 
 if __name__ == "__main__":  # pragma: nocover
-    ops.main(UbuntuMetrics)  # type: ignore
+    from profiling import main
+
+    main(UbuntuMetrics)
@@ -0,0 +1,137 @@
+import logging
+import time
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Optional
+
+if TYPE_CHECKING:
+    import requests
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+@dataclass
+class LatencyHistogram:
+    """Per-bucket latency counts in seconds, plus a final overflow bucket past the last bound."""
+
+    buckets: tuple[float, ...] = LATENCY_BUCKETS
+    counts: list[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+    total: float = 0.0
+    count: int = 0
+    errors: int = 0
+
+    def observe(self, seconds: float, ok: bool = True) -> None:
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+        if not ok:
+            self.errors += 1
+
+
+class WorkloadClient:
+    """Keep-alive HTTP client for the workload's API.
+
+    One client is shared per base url for the lifetime of the dispatch so
+    repeated probes reuse the same TCP connection.
+    """
+
+    _clients: dict[str, "WorkloadClient"] = {}
+
+    def __init__(
+        self,
+        base_url: str,
+        timeouts: Optional[dict[str, float]] = None,
+        default_timeout: float = 5,
+        pool_size: int = 4,
+        log_requests: bool = True,
+    ) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.log_requests = log_requests
+        self.timeouts = dict(timeouts or {})
+        self.default_timeout = default_timeout
+        self.pool_size = pool_size
+        self.histograms: dict[str, LatencyHistogram] = {}
+
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self._session = requests.Session()
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    @classmethod
+    def for_base_url(cls, base_url: str, **kwargs: Any) -> "WorkloadClient":
+        """Return the shared client for `base_url`, creating it on first use.
+
+        Later callers may add per-path timeouts to a cached client, but any setting that
+        differs from the one it was created with raises ValueError rather than being dropped.
+        """
+        client = cls._clients.get(base_url)
+        if client is None:
+            client = cls(base_url, **kwargs)
+            cls._clients[base_url] = client
+            return client
+
+        timeouts = kwargs.pop("timeouts", None) or {}
+        conflicts = {
+            path
+            for path, timeout in timeouts.items()
+            if client.timeouts.get(path, timeout) != timeout
+        }
+        conflicts |= {
+            name for name, value in kwargs.items() if getattr(client, name, None) != value
+        }
+        if conflicts:
+            raise ValueError(
+                f"Client for {base_url} already exists with different {sorted(conflicts)}"
+            )
+
+        client.timeouts.update(timeouts)
+        return client
+
+    @classmethod
+    def shared_clients(cls) -> list["WorkloadClient"]:
+        """Clients handed out by for_base_url during this dispatch."""
+        return list(cls._clients.values())
+
+    def url(self, path: str = "") -> str:
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def get(self, path: str, timeout: Optional[float] = None) -> "requests.Response":
+        return self.request("GET", path, timeout)
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        timeout: Optional[float] = None,
+        data: Optional[str] = None,
+        headers: Optional[dict[str, str]] = None,
+    ) -> "requests.Response":
+        if timeout is None:
+            timeout = self.timeouts.get(path, self.default_timeout)
+
+        histogram = self.histograms.setdefault(path, LatencyHistogram())
+        start = time.perf_counter()
+        ok = False
+
+        try:
+            response = self._session.request(
+                method, self.url(path), timeout=timeout, data=data, headers=headers
+            )
+            ok = response.ok
+            return response
+        finally:
+            elapsed = time.perf_counter() - start
+            histogram.observe(elapsed, ok)
+            if self.log_requests:
+                logger.debug(f"{method} /{path} took {elapsed * 1000:.1f}ms (ok={ok})")
+
+    def get_json(self, path: str, timeout: Optional[float] = None) -> Any:
+        return self.get(path, timeout).json()
+
+    def close(self) -> None:
+        self._session.close()
@@ -0,0 +1,98 @@
+import logging
+
+from entities import ComputeResources
+
+logger = logging.getLogger(__name__)
+
+
+class ComputeResourcesError(Exception):
+    pass
+
+
+class ComputeResourcesPatch:
+    """Applies CPU and memory requests/limits to a container of the app's StatefulSet.
+
+    lightkube is only imported once resources are configured, so hooks of charms that
+    never set them do not pay for it. Cleared values are sent as nulls, which a strategic
+    merge patch treats as a deletion, so unsetting an option removes it from the pod spec.
+    """
+
+    def __init__(self, namespace: str, app_name: str, container_name: str) -> None:
+        self.namespace = namespace
+        self.app_name = app_name
+        self.container_name = container_name
+
+    def apply(self, resources: ComputeResources) -> bool:
+        """Patch the StatefulSet when its template differs; return True if it was patched."""
+        from lightkube import ApiError, Client
+        from lightkube.resources.apps_v1 import StatefulSet
+        from lightkube.types import PatchType
+
+        try:
+            client = Client(field_manager=self.app_name)
+            statefulset = client.get(StatefulSet, self.app_name, namespace=self.namespace)
+            containers = statefulset.spec.template.spec.containers  # type: ignore
+            if self._matches(containers, resources):
+                return False
+
+            patch = {
+                "spec": {
+                    "template": {
+                        "spec": {
+                            "containers": [
+                                {
+                                    "name": self.container_name,
+                                    "resources": {
+                                        "requests": {
+                                            "cpu": resources.cpu_request or None,
+                                            "memory": resources.memory_request or None,
+                                        },
+                                        "limits": {
+                                            "cpu": resources.cpu_limit or None,
+                                            "memory": resources.memory_limit or None,
+                                        },
+                                    },
+                                }
+                            ]
+                        }
+                    }
+                }
+            }
+            client.patch(
+                StatefulSet,
+                self.app_name,
+                patch,
+                namespace=self.namespace,
+                patch_type=PatchType.STRATEGIC,
+            )
+        except ApiError as e:
+            raise ComputeResourcesError(f"Failed to patch StatefulSet: {e}") from e
+
+        logger.info(f"Patched {self.container_name} resources on StatefulSet {self.app_name}")
+        return True
+
+    def is_rolled_out(self, pod_name: str, resources: ComputeResources) -> bool:
+        """Whether the running pod already carries the configured resources."""
+        from lightkube import ApiError, Client
+        from lightkube.resources.core_v1 import Pod
+
+        try:
+            pod = Client().get(Pod, pod_name, namespace=self.namespace)
+        except ApiError as e:
+            raise ComputeResourcesError(f"Failed to read pod {pod_name}: {e}") from e
+
+        return self._matches(pod.spec.containers, resources)  # type: ignore
+
+    def _matches(self, containers: list, resources: ComputeResources) -> bool:
+        from lightkube.utils.quantity import equals_canonically
+
+        for container in containers:
+            if container.name != self.container_name:
+                continue
+
+            current = container.resources
+            return equals_canonically(
+                current.requests if current else None, resources.requests or None
+            ) and equals_canonically(current.limits if current else None, resources.limits or None)
+
+        return False
@@ -1,3 +1,4 @@
+import math
 from dataclasses import dataclass
 from enum import Enum
 from typing import Optional
@@ -8,6 +9,141 @@ class About:
     version: str
 
 
+@dataclass
+class HealthCheck:
+    """Pebble check tuning; durations use Pebble's Go-style syntax, e.g. "10s"."""
+
+    period: str = "10s"
+    timeout: str = "3s"
+    threshold: int = 3
+
+
+@dataclass
+class IngressLimits:
+    """Traefik middleware settings; a zero value leaves that middleware out."""
+
+    rate_limit_average: int = 0
+    rate_limit_burst: int = 0
+    max_in_flight: int = 0
+    max_request_body_bytes: int = 0
+
+
+@dataclass
+class LogPipeline:
+    """How promtail parses and filters workload lines before shipping them."""
+
+    log_format: str = ""
+    drop_levels: tuple[str, ...] = ()
+
+
+@dataclass
+class LogRotation:
+    """Copy-truncate rotation of the workload log; a zero limit turns that trigger off."""
+
+    max_bytes: int = 0
+    max_age: int = 0
+    keep: int = 1
+
+    @property
+    def is_enabled(self) -> bool:
+        return self.max_bytes > 0 or self.max_age > 0
+
+    def is_due(self, size: int, rotated_at: float, now: float) -> bool:
+        if size == 0:
+            return False
+        if self.max_bytes and size >= self.max_bytes:
+            return True
+        return bool(self.max_age) and now - rotated_at >= self.max_age
+
+
+@dataclass
+class DbTuning:
+    """Connection limits shared out between units so scaling out never exhausts Postgres."""
+
+    max_connections: int = 100
+    connection_fraction: float = 0.8
+    connect_timeout: int = 10
+    statement_timeout_ms: int = 30000
+
+    def pool_size(self, units: int) -> int:
+        budget = int(self.max_connections * self.connection_fraction)
+        return max(budget // max(units, 1), 1)
+
+
+@dataclass
+class GoRuntime:
+    """Go runtime settings derived from the container's cgroup limits, unless overridden."""
+
+    cpus: Optional[float] = None
+    memory_bytes: Optional[int] = None
+
+    max_procs: int = 0
+    memory_limit: str = ""
+    memory_ratio: float = 0.9
+    gc: int = 100
+
+    @property
+    def environment(self) -> dict[str, str]:
+        environment = {"GOGC": str(self.gc)}
+
+        if self.max_procs > 0:
+            environment["GOMAXPROCS"] = str(self.max_procs)
+        elif self.cpus:
+            environment["GOMAXPROCS"] = str(max(math.floor(self.cpus), 1))
+
+        if self.memory_limit:
+            environment["GOMEMLIMIT"] = self.memory_limit
+        elif self.memory_bytes:
+            environment["GOMEMLIMIT"] = str(int(self.memory_bytes * self.memory_ratio))
+
+        return environment
+
+    @staticmethod
+    def parse_cpu_max(value: Optional[str]) -> Optional[float]:
+        """Parse cgroup v2 cpu.max, e.g. "200000 100000" or "max 100000"."""
+        if not value:
+            return None
+
+        quota, _, period = value.strip().partition(" ")
+        if quota == "max" or not period:
+            return None
+
+        return int(quota) / int(period)
+
+    @staticmethod
+    def parse_memory_max(value: Optional[str]) -> Optional[int]:
+        """Parse cgroup v2 memory.max; cgroup v1 reports "unlimited" as a huge number."""
+        if not value or value.strip() == "max":
+            return None
+
+        limit = int(value)
+        return limit if limit < 2**60 else None
+
+
+@dataclass
+class ComputeResources:
+    """Kubernetes requests/limits for the workload container; empty values are removed."""
+
+    cpu_request: str = ""
+    cpu_limit: str = ""
+    memory_request: str = ""
+    memory_limit: str = ""
+
+    @property
+    def requests(self) -> dict[str, str]:
+        values = {"cpu": self.cpu_request, "memory": self.memory_request}
+        return {key: value for key, value in values.items() if value}
+
+    @property
+    def limits(self) -> dict[str, str]:
+        values = {"cpu": self.cpu_limit, "memory": self.memory_limit}
+        return {key: value for key, value in values.items() if value}
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.requests and not self.limits
+
+
 class WorkloadEnv(Enum):
     Prod = "prod"
     Stg = "stg"
@@ -37,3 +173,20 @@ class LogLevel(Enum):
                 return member
 
         return LogLevel.Info
+
+
+class LoggingMode(Enum):
+    """How workload logs reach Loki: a promtail sidecar process or Pebble log forwarding."""
+
+    Promtail = "promtail"
+    Pebble = "pebble"
+
+    @classmethod
+    def try_from_string(cls, value: str) -> "LoggingMode":
+        value = value.lower()
+
+        for member in cls:
+            if member.value == value:
+                return member
+
+        return LoggingMode.Promtail
@@ -0,0 +1,103 @@
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional
+
+from client import LatencyHistogram, WorkloadClient
+
+MAX_CONCURRENCY = 64
+MAX_DURATION = 300
+
+
+@dataclass
+class RequestTemplate:
+    method: str = "GET"
+    path: str = "about"
+    body: Optional[str] = None
+    content_type: str = "application/json"
+
+    @property
+    def headers(self) -> dict[str, str]:
+        return {"Content-Type": self.content_type} if self.body else {}
+
+
+@dataclass
+class LoadTestReport:
+    elapsed: float = 0.0
+    errors: int = 0
+    latencies: list[float] = field(default_factory=list)
+    histogram: LatencyHistogram = field(default_factory=LatencyHistogram)
+
+    @property
+    def requests(self) -> int:
+        return len(self.latencies)
+
+    @property
+    def throughput(self) -> float:
+        return self.requests / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, q: float) -> float:
+        """Exact latency percentile in seconds, nearest-rank: the ceil(q*n)-th smallest."""
+        if not self.latencies:
+            return 0.0
+
+        ordered = sorted(self.latencies)
+        rank = math.ceil(q * len(ordered))
+        return ordered[min(max(rank, 1), len(ordered)) - 1]
+
+
+def run(
+    base_url: str,
+    template: RequestTemplate,
+    concurrency: int = 4,
+    duration: float = 10,
+    max_requests: int = 100_000,
+    timeout: float = 5,
+) -> LoadTestReport:
+    """Drive `template` against `base_url` from `concurrency` workers until a bound is hit."""
+    concurrency = min(max(concurrency, 1), MAX_CONCURRENCY)
+    duration = min(max(duration, 0), MAX_DURATION)
+
+    report = LoadTestReport()
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker() -> None:
+        import requests
+
+        client = WorkloadClient(base_url, pool_size=1, log_requests=False)
+        try:
+            while time.monotonic() < deadline:
+                with lock:
+                    if report.requests >= max_requests:
+                        return
+
+                start = time.perf_counter()
+                try:
+                    response = client.request(
+                        template.method, template.path, timeout, template.body, template.headers
+                    )
+                    ok = response.ok
+                except requests.RequestException:
+                    ok = False
+                elapsed = time.perf_counter() - start
+
+                with lock:
+                    report.latencies.append(elapsed)
+                    report.histogram.observe(elapsed, ok)
+                    report.errors += 0 if ok else 1
+        finally:
+            client.close()
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        workers = [pool.submit(worker) for _ in range(concurrency)]
+    report.elapsed = time.monotonic() - start
+
+    # A worker only stops early on a bug, not a failed request; surface it over a short report.
+    for future in workers:
+        future.result()
+
+    return report
@@ -0,0 +1,62 @@
+import logging
+import posixpath
+from typing import Optional
+
+import ops
+import yaml
+
+logger = logging.getLogger(__name__)
+
+EXEC_TIMEOUT = 60
+
+
+def rotate(
+    container: ops.Container, path: str, keep: int, positions_path: Optional[str] = None
+) -> None:
+    """Copy-truncate `path` into `path`.1, shifting older generations up to `path`.`keep`.
+
+    Truncating keeps the workload's file descriptor valid, so it needs no signal to reopen.
+    When promtail's positions file is given its offset into `path` moves to `path`.1, so the
+    unread tail of the rotated copy is still shipped and nothing is read twice. Promtail
+    must be stopped while this runs, as it rewrites the positions file from memory.
+    """
+    directory, name = posixpath.split(path)
+    existing = {f.path for f in container.list_files(directory, pattern=f"{name}.*")}
+
+    generations = [f"{path}.{i}" for i in range(1, keep + 1)]
+    for stale in existing - set(generations):
+        if stale.rpartition(".")[2].isdigit():
+            container.remove_path(stale)
+
+    for i in range(keep - 1, 0, -1):
+        if generations[i - 1] in existing:
+            _exec(container, "mv", "-f", generations[i - 1], generations[i])
+
+    _exec(container, "cp", "-p", path, generations[0])
+    _exec(container, "truncate", "-s", "0", path)
+
+    if positions_path is not None:
+        _carry_over_position(container, positions_path, path, generations[0], generations[1:])
+
+
+def _exec(container: ops.Container, *command: str) -> None:
+    container.exec(list(command), timeout=EXEC_TIMEOUT).wait()
+
+
+def _carry_over_position(
+    container: ops.Container, positions_path: str, path: str, rotated: str, dropped: list[str]
+) -> None:
+    try:
+        state = yaml.safe_load(container.pull(positions_path).read()) or {}
+    except ops.pebble.PathError:
+        return
+
+    positions = state.get("positions") or {}
+    positions[rotated] = positions.pop(path, "0")
+    positions[path] = "0"
+    for stale in dropped:
+        positions.pop(stale, None)
+
+    state["positions"] = positions
+    container.push(positions_path, yaml.safe_dump(state), make_dirs=True)
+    logger.debug(f"Moved promtail's offset into {path} over to {rotated}")
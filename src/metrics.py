@@ -0,0 +1,114 @@
+import functools
+import time
+from typing import Any, Callable, Iterable, TypeVar
+
+from client import LatencyHistogram, WorkloadClient
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+HANDLER_METRIC = "ubuntu_metrics_charm_handler_duration_seconds"
+HANDLER_ERRORS_METRIC = "ubuntu_metrics_charm_handler_errors_total"
+CLIENT_METRIC = "ubuntu_metrics_charm_api_request_duration_seconds"
+CLIENT_ERRORS_METRIC = "ubuntu_metrics_charm_api_request_errors_total"
+
+
+class HandlerTimings:
+    """Cumulative per-handler durations, persisted between dispatches as plain dicts."""
+
+    metric = HANDLER_METRIC
+    errors_metric = HANDLER_ERRORS_METRIC
+    label = "handler"
+    help = "Time spent in UbuntuMetrics charm handlers."
+    errors_help = "UbuntuMetrics charm handlers that raised."
+
+    def __init__(self, snapshot: dict) -> None:
+        self.histograms: dict[str, LatencyHistogram] = {
+            handler: LatencyHistogram(
+                counts=list(values["counts"]),
+                total=values["total"],
+                count=values["count"],
+                errors=values["errors"],
+            )
+            for handler, values in snapshot.items()
+        }
+
+    def observe(self, handler: str, seconds: float, ok: bool) -> None:
+        self.histograms.setdefault(handler, LatencyHistogram()).observe(seconds, ok)
+
+    def snapshot(self) -> dict:
+        return {
+            handler: {
+                "counts": histogram.counts,
+                "total": histogram.total,
+                "count": histogram.count,
+                "errors": histogram.errors,
+            }
+            for handler, histogram in self.histograms.items()
+        }
+
+    def to_prometheus(self) -> str:
+        metric, errors_metric, label = self.metric, self.errors_metric, self.label
+        lines = [
+            f"# HELP {metric} {self.help}",
+            f"# TYPE {metric} histogram",
+        ]
+
+        for name, histogram in sorted(self.histograms.items()):
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{{label}="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{{label}="{name}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{metric}_sum{{{label}="{name}"}} {histogram.total}')
+            lines.append(f'{metric}_count{{{label}="{name}"}} {histogram.count}')
+
+        lines += [
+            f"# HELP {errors_metric} {self.errors_help}",
+            f"# TYPE {errors_metric} counter",
+        ]
+        for name, histogram in sorted(self.histograms.items()):
+            lines.append(f'{errors_metric}{{{label}="{name}"}} {histogram.errors}')
+
+        return "\n".join(lines) + "\n"
+
+
+class ClientTimings(HandlerTimings):
+    """Cumulative WorkloadClient request durations per API path, persisted like HandlerTimings.
+
+    Keyed by path rather than url, so scrapes of peer pods whose IPs come and go do not
+    add series that are never retired.
+    """
+
+    metric = CLIENT_METRIC
+    errors_metric = CLIENT_ERRORS_METRIC
+    label = "path"
+    help = "Time spent in UbuntuMetrics charm requests to the workload API."
+    errors_help = "UbuntuMetrics charm requests to the workload API that failed."
+
+    def collect(self, clients: Iterable[WorkloadClient]) -> None:
+        """Fold the clients' per-path histograms in, resetting them so none is counted twice."""
+        for client in clients:
+            for path, histogram in client.histograms.items():
+                total = self.histograms.setdefault(f"/{path.lstrip('/')}", LatencyHistogram())
+                total.counts = [a + b for a, b in zip(total.counts, histogram.counts)]
+                total.total += histogram.total
+                total.count += histogram.count
+                total.errors += histogram.errors
+            client.histograms = {}
+
+
+def timed(method: F) -> F:
+    """Record the duration and outcome of a charm method in `self._timings`."""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        start = time.perf_counter()
+        ok = False
+        try:
+            result = method(self, *args, **kwargs)
+            ok = True
+            return result
+        finally:
+            self._timings.observe(method.__name__, time.perf_counter() - start, ok)
+
+    return wrapper  # type: ignore
@@ -0,0 +1,78 @@
+import io
+import os
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Type
+
+import ops
+
+if TYPE_CHECKING:
+    import cProfile
+
+MAX_PROFILES = 20
+
+
+def profile_dir() -> Path:
+    return Path(os.environ.get("JUJU_CHARM_DIR", ".")) / ".profiles"
+
+
+def remaining_dispatches() -> int:
+    try:
+        return int((profile_dir() / "remaining").read_text())
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def arm(dispatches: int) -> None:
+    """Profile the next `dispatches` dispatches; 0 turns profiling off."""
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / "remaining").write_text(str(max(dispatches, 0)))
+
+
+def main(charm_class: Type[ops.CharmBase]) -> None:
+    """Run ops.main, under cProfile while armed; when disarmed this costs one failed open."""
+    remaining = remaining_dispatches()
+    if remaining <= 0:
+        ops.main(charm_class)  # type: ignore
+        return
+
+    import cProfile
+
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        ops.main(charm_class)  # type: ignore
+    finally:
+        profile.disable()
+        _save(profile)
+        arm(remaining_dispatches() - 1)
+
+
+def _save(profile: "cProfile.Profile") -> None:
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+
+    hook = Path(os.environ.get("JUJU_DISPATCH_PATH", "unknown")).name
+    profile.dump_stats(directory / f"{time.time_ns()}-{hook}.pstats")
+
+    for stale in profiles()[:-MAX_PROFILES]:
+        stale.unlink(missing_ok=True)
+
+
+def profiles() -> list[Path]:
+    """Return the saved profiles, oldest first."""
+    return sorted(profile_dir().glob("*.pstats"))
+
+
+def summarize(top: int = 20, sort: str = "cumulative") -> str:
+    paths = profiles()
+    if not paths:
+        return "no profiles captured"
+
+    import pstats
+
+    out = io.StringIO()
+    stats = pstats.Stats(*map(str, paths), stream=out)
+    stats.strip_dirs().sort_stats(sort).print_stats(top)
+    return out.getvalue()
@@ -0,0 +1,142 @@
+import logging
+import math
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from client import WorkloadClient
+
+logger = logging.getLogger(__name__)
+
+REQUESTS_METRIC = "metrics_requests_total"
+ERRORS_METRIC = "metrics_errors_total"
+UPTIME_METRIC = "metrics_uptime_seconds"
+
+
+@dataclass
+class MetricsSample:
+    requests: float
+    errors: float
+    uptime: float
+    taken_at: float
+
+
+@dataclass
+class UnitLoad:
+    address: str
+    request_rate: float
+    error_ratio: float
+    saturation: float
+
+
+@dataclass
+class ScalingAdvice:
+    units: list[UnitLoad]
+    unreachable: list[str]
+    request_rate: float
+    error_ratio: float
+    current_units: int
+    recommended_units: int
+
+
+def parse_metrics(text: str) -> dict[str, float]:
+    """Sum every series of each metric in a Prometheus text exposition."""
+    totals: dict[str, float] = {}
+
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        name_and_labels, _, rest = line.rpartition("}") if "}" in line else line.partition(" ")
+        name = name_and_labels.split("{")[0].strip()
+        value = rest.split()[0] if rest.split() else ""
+
+        try:
+            totals[name] = totals.get(name, 0.0) + float(value)
+        except ValueError:
+            continue
+
+    return totals
+
+
+def scrape(address: str, port: int, timeout: float = 5) -> MetricsSample:
+    client = WorkloadClient.for_base_url(f"http://{address}:{port}")
+    response = client.get("metrics", timeout)
+    response.raise_for_status()
+
+    metrics = parse_metrics(response.text)
+    return MetricsSample(
+        requests=metrics.get(REQUESTS_METRIC, 0.0),
+        errors=metrics.get(ERRORS_METRIC, 0.0),
+        uptime=metrics.get(UPTIME_METRIC, 0.0),
+        taken_at=time.monotonic(),
+    )
+
+
+def unit_load(
+    address: str, before: MetricsSample, after: MetricsSample, target_rps_per_unit: float
+) -> UnitLoad:
+    elapsed = max(after.taken_at - before.taken_at, 1e-9)
+    restarted = after.uptime < before.uptime or after.requests < before.requests
+
+    requests = after.requests if restarted else after.requests - before.requests
+    errors = after.errors if restarted else after.errors - before.errors
+
+    rate = requests / elapsed
+    return UnitLoad(
+        address=address,
+        request_rate=rate,
+        error_ratio=errors / requests if requests else 0.0,
+        saturation=rate / target_rps_per_unit if target_rps_per_unit else 0.0,
+    )
+
+
+def advise(
+    addresses: list[str],
+    port: int,
+    window: float,
+    target_rps_per_unit: float,
+    max_error_ratio: float,
+    sleep: Callable[[float], None] = time.sleep,
+) -> ScalingAdvice:
+    """Scrape every unit twice, `window` seconds apart, and size the app against the targets."""
+    unreachable: list[str] = []
+
+    def try_scrape(address: str) -> Optional[MetricsSample]:
+        import requests
+
+        try:
+            return scrape(address, port)
+        except requests.RequestException as e:
+            logger.warning(f"Failed to scrape {address}: {e}")
+            unreachable.append(address)
+            return None
+
+    before = {address: try_scrape(address) for address in addresses}
+    sleep(window)
+    after = {address: try_scrape(address) for address in addresses}
+
+    loads = []
+    for address in addresses:
+        first, second = before[address], after[address]
+        if first is not None and second is not None:
+            loads.append(unit_load(address, first, second, target_rps_per_unit))
+
+    request_rate = sum(load.request_rate for load in loads)
+    weighted_errors = sum(load.error_ratio * load.request_rate for load in loads)
+    error_ratio = weighted_errors / request_rate if request_rate else 0.0
+
+    current = len(addresses)
+    recommended = max(math.ceil(request_rate / target_rps_per_unit), 1)
+    if error_ratio > max_error_ratio:
+        recommended = max(recommended, current + 1)
+
+    return ScalingAdvice(
+        units=loads,
+        unreachable=sorted(set(unreachable)),
+        request_rate=request_rate,
+        error_ratio=error_ratio,
+        current_units=current,
+        recommended_units=recommended,
+    )
@@ -1,7 +1,13 @@
+import importlib
+import time
+from types import ModuleType
 from typing import Any, Optional, TypeVar
 
 T = TypeVar("T")
 
+"""Milliseconds spent importing each module loaded through timed_import, in load order."""
+IMPORT_TIMES: dict[str, float] = {}
+
 
 def get_or_fail(value: Optional[T], name: str = "unknown") -> T:
     if value is None:
@@ -19,3 +25,16 @@ def stringify(instance: Any) -> str:
     class_name = instance.__class__.__name__
     properties_str = ", ".join(f"{attr}={value}" for attr, value in instance.__dict__.items())
     return f"{class_name}{{{properties_str}}}"
+
+
+def timed_import(module: str) -> ModuleType:
+    start = time.perf_counter()
+    imported = importlib.import_module(module)
+    IMPORT_TIMES.setdefault(module, (time.perf_counter() - start) * 1000)
+    return imported
+
+
+def import_report() -> str:
+    total = sum(IMPORT_TIMES.values())
+    modules = ", ".join(f"{module}={ms:.1f}ms" for module, ms in IMPORT_TIMES.items())
+    return f"imports took {total:.1f}ms: {modules}"
@@ -1,20 +1,53 @@
+import hashlib
 import json
 import logging
-from dataclasses import dataclass
+import time
+from dataclasses import asdict, dataclass, replace
 from enum import Enum
+from pathlib import Path
 from typing import Optional
+from urllib.parse import quote, urlencode
 
 import ops
-import requests
-from entities import About, LogLevel, WorkloadEnv
+from client import WorkloadClient
+from entities import (
+    About,
+    ComputeResources,
+    DbTuning,
+    GoRuntime,
+    HealthCheck,
+    IngressLimits,
+    LoggingMode,
+    LogLevel,
+    LogPipeline,
+    LogRotation,
+    WorkloadEnv,
+)
 from utils import get_or_fail
 
 logger = logging.getLogger(__name__)
 
+API_TIMEOUTS = {"about": 10.0}
+
+
+SNAPSHOT_VERSION = 2
+
+"""Relation-derived builder state kept between hooks; config is cheap to re-read and secrets
+are never persisted, the password is re-read through db_relation_id when building."""
+SNAPSHOT_FIELDS = (
+    "db_host",
+    "db_port",
+    "db_username",
+    "db_relation_id",
+    "db_read_endpoints",
+    "unit_addresses",
+    "unit_count",
+    "loki_endpoints",
+)
+
 
 class WorkloadAgentBuilderState(Enum):
     DatabaseNotReady = "DatabaseNotReady"
-    IngressNotReady = "IngressNotReady"
     EnvNotSet = "EnvNotSet"
     Ready = "All config values set"
 
@@ -27,6 +60,19 @@ class WorkloadAgent:
     name: str
     port: int
     log_level: LogLevel
+    health_check: HealthCheck
+    go_runtime: GoRuntime
+    compute_resources: ComputeResources
+    charm_metrics_port: int
+    charm_metrics_file: str
+    loki_endpoints: list[str]
+    log_labels: dict[str, str]
+    log_target_names: list[str]
+
+    unit_addresses: list[str]
+    ingress_ready: bool
+    ingress_sticky: bool
+    ingress_limits: IngressLimits
 
     db_name: str
     db_relation_name: str
@@ -34,6 +80,11 @@ class WorkloadAgent:
     db_port: int
     db_username: str
     db_password: str
+    db_read_endpoints: list[str]
+    db_read_round_robin: bool
+    db_tuning: DbTuning
+    unit_count: int
+    unit_index: int
 
     @property
     def external_hostname(self) -> str:
@@ -55,58 +106,249 @@ class WorkloadAgent:
             }
         }
 
-        services = {
-            f"{self.name}_service": {
-                "loadBalancer": {
-                    "servers": [
-                        {"url": f"http://{self.name}.{self.model}.svc.cluster.local:{self.port}"}
-                    ]
+        servers = [{"url": f"http://{address}:{self.port}"} for address in self.unit_addresses]
+        if not servers:
+            servers = [{"url": f"http://{self.name}.{self.model}.svc.cluster.local:{self.port}"}]
+
+        load_balancer: dict = {
+            "servers": servers,
+            "healthCheck": {
+                "path": "/about",
+                "interval": self.health_check.period,
+                "timeout": self.health_check.timeout,
+            },
+        }
+
+        if self.ingress_sticky:
+            load_balancer["sticky"] = {
+                "cookie": {"name": f"{self.name}_affinity", "httpOnly": True, "secure": True}
+            }
+
+        services = {f"{self.name}_service": {"loadBalancer": load_balancer}}
+
+        config: dict = {"routers": routers, "services": services}
+
+        middlewares = self.create_ingress_middlewares
+        if middlewares:
+            routers[self.name]["middlewares"] = list(middlewares)
+            config["middlewares"] = middlewares
+
+        return {"http": config}
+
+    @property
+    def create_ingress_middlewares(self) -> dict:
+        limits = self.ingress_limits
+        middlewares = {}
+
+        if limits.rate_limit_average > 0:
+            middlewares[f"{self.name}_ratelimit"] = {
+                "rateLimit": {
+                    "average": limits.rate_limit_average,
+                    "burst": max(limits.rate_limit_burst, 1),
                 }
             }
-        }
 
-        return {"http": {"routers": routers, "services": services}}
+        if limits.max_in_flight > 0:
+            # Without a sourceCriterion Traefik groups by request host, i.e. one shared cap.
+            middlewares[f"{self.name}_inflightreq"] = {
+                "inFlightReq": {
+                    "amount": limits.max_in_flight,
+                    "sourceCriterion": {"ipStrategy": {}},
+                }
+            }
+
+        if limits.max_request_body_bytes > 0:
+            middlewares[f"{self.name}_buffering"] = {
+                "buffering": {
+                    "maxRequestBodyBytes": limits.max_request_body_bytes,
+                    "retryExpression": "IsNetworkError() && Attempts() < 2",
+                }
+            }
+
+        return middlewares
 
     @property
     def create_pebble_layer(self) -> ops.pebble.Layer:
-        db_connection_string = f"postgresql://{self.db_username}:{self.db_password}@{self.db_host}:{self.db_port}/{self.db_name}"
+        tuning = self.db_tuning
+        pool_size = tuning.pool_size(self.unit_count)
+        db_params = urlencode(
+            {
+                "pool_max_conns": pool_size,
+                "connect_timeout": tuning.connect_timeout,
+                "options": f"-c statement_timeout={tuning.statement_timeout_ms}",
+            },
+            quote_via=quote,
+        )
+        db_connection_string = self.db_uri(f"{self.db_host}:{self.db_port}", db_params)
 
         environment: dict[str, str] = {
             "UBUNTU-REPORTD_SERVERPORT": str(self.port),
             "LOG_LEVEL": self.log_level.value,
             "DB_URI": db_connection_string,
+            "DB_MAX_CONNS": str(pool_size),
+            "DB_CONNECT_TIMEOUT": str(tuning.connect_timeout),
+            "DB_STATEMENT_TIMEOUT": str(tuning.statement_timeout_ms),
+            **self.go_runtime.environment,
         }
 
-        layer = ops.pebble.Layer(
-            {
-                "summary": "ubuntu-metrics base layer definition",
-                "services": {
-                    self.name: {
-                        "override": "replace",
-                        "summary": f"{self.name} pebble config layer",
-                        "startup": "enabled",
-                        "command": "/app/ubuntu-reportd -vvv",
-                        "environment": environment,
-                    }
-                },
+        # Without replicas a read pool would open a second pool_size against the primary,
+        # doubling its share of max_connections, so reads stay on DB_URI's pool instead.
+        if self.db_read_hosts:
+            environment["DB_READ_URI"] = self.db_uri(self.db_read_hosts, db_params)
+
+        check = self.health_check
+        check_url = f"http://localhost:{self.port}/about"
+        checks: dict[str, ops.pebble.CheckDict] = {
+            f"{self.name}-{level}": {
+                "override": "replace",
+                "level": level,
+                "period": check.period,
+                "timeout": check.timeout,
+                "threshold": check.threshold,
+                "http": {"url": check_url},
             }
+            for level in ("alive", "ready")
+        }
+
+        raw: ops.pebble.LayerDict = {
+            "summary": "ubuntu-metrics base layer definition",
+            "services": {
+                self.name: {
+                    "override": "replace",
+                    "summary": f"{self.name} pebble config layer",
+                    "startup": "enabled",
+                    "command": "/app/ubuntu-reportd -vvv",
+                    "environment": environment,
+                    "on-check-failure": {f"{self.name}-alive": "restart"},
+                    "backoff-delay": "500ms",
+                    "backoff-factor": 2,
+                    "backoff-limit": "30s",
+                }
+            },
+            "checks": checks,
+            "log-targets": self.log_targets,
+        }
+        return ops.pebble.Layer(raw)
+
+    @property
+    def charm_metrics_service(self) -> str:
+        return f"{self.name}-charm-metrics"
+
+    @property
+    def create_charm_metrics_layer(self) -> ops.pebble.Layer:
+        """Serve the charm's timings textfile; disabled at startup so a replan never needs it.
+
+        It is a separate layer because the image may lack python3; the charm starts it
+        explicitly and a failure there must not fail the workload's replan.
+        """
+        directory = str(Path(self.charm_metrics_file).parent)
+        raw: ops.pebble.LayerDict = {
+            "summary": "ubuntu-metrics charm metrics layer definition",
+            "services": {
+                self.charm_metrics_service: {
+                    "override": "replace",
+                    "summary": "serves the charm's handler timings for Prometheus",
+                    "startup": "disabled",
+                    "command": f"python3 -m http.server {self.charm_metrics_port} --directory {directory}",
+                }
+            },
+        }
+        return ops.pebble.Layer(raw)
+
+    @property
+    def log_targets(self) -> dict[str, ops.pebble.LogTargetDict]:
+        """Pebble log targets forwarding the workload's output to each Loki push endpoint.
+
+        Targets from `log_target_names` that are no longer wanted stay in the layer with
+        every service removed, as a combined layer cannot drop a log target.
+        """
+        targets: dict[str, ops.pebble.LogTargetDict] = {
+            name: {"override": "merge", "services": ["-all"]} for name in self.log_target_names
+        }
+        for index, url in enumerate(self.loki_endpoints):
+            targets[f"{self.name}-loki-{index}"] = {
+                "override": "replace",
+                "type": "loki",
+                "location": url,
+                "services": [self.name],
+                "labels": self.log_labels,
+            }
+        return targets
+
+    @property
+    def db_read_hosts(self) -> str:
+        """Replica hosts for this unit, empty when there are none.
+
+        Multi-host URIs are tried in order, so the list starts at a different replica on
+        each unit; the others stay as failover.
+        """
+        endpoints = self.db_read_endpoints
+        if not endpoints:
+            return ""
+
+        first = self.unit_index % len(endpoints)
+        if self.db_read_round_robin:
+            return endpoints[first]
+
+        return ",".join(endpoints[first:] + endpoints[:first])
+
+    def db_uri(self, hosts: str, params: str) -> str:
+        return (
+            f"postgresql://{self.db_username}:{self.db_password}@{hosts}/{self.db_name}?{params}"
         )
-        return layer
+
+    @property
+    def fingerprint(self) -> str:
+        """Content hash of everything a reconcile pushes to Pebble and Traefik."""
+        content = {
+            "layer": self.create_pebble_layer.to_dict(),
+            "ingress": self.create_ingress_config if self.ingress_ready else None,
+            "resources": asdict(self.compute_resources),
+        }
+        encoded = json.dumps(content, sort_keys=True).encode()
+        return hashlib.sha256(encoded).hexdigest()
+
+    @property
+    def client(self) -> WorkloadClient:
+        return WorkloadClient.for_base_url(f"http://localhost:{self.port}", timeouts=API_TIMEOUTS)
 
     def api_url(self, path="") -> str:
-        return f"http://localhost:{self.port}/{path}"
+        return self.client.url(path)
+
+    def fetch_version(self, timeout: Optional[float] = None) -> Optional[str]:
+        import requests
 
-    def fetch_version(self) -> str:
         try:
-            response = requests.get(self.api_url("about"), timeout=10)
-            about = About(**response.json())
+            about = About(**self.client.get_json("about", timeout))
             return about.version
+        except requests.RequestException as e:
+            logger.warning(f"Failed to reach workload: {e}")
+            return None
         except json.JSONDecodeError as e:
             logger.warning(f"Failed to parse response: {e}")
-            return "unknown"
+            return None
         except TypeError as e:
             logger.warning(f"Failed to construct About: {e}")
-            return "unknown"
+            return None
+
+    def probe_version(self, budget: float = 5, attempts: int = 3) -> Optional[str]:
+        """Retry fetch_version with backoff, never spending more than `budget` seconds."""
+        deadline = time.monotonic() + budget
+        delay = 0.5
+
+        for _ in range(attempts):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            version = self.fetch_version(timeout=remaining)
+            if version is not None:
+                return version
+
+            time.sleep(max(0, min(delay, deadline - time.monotonic())))
+            delay *= 2
+
+        return None
 
 
 class WorkloadAgentBuilder:
@@ -122,6 +364,9 @@ class WorkloadAgentBuilder:
         self.env: Optional[WorkloadEnv] = None
         self.name = "metrics"
         self.port = 8080
+        self.health_check = HealthCheck()
+        self.go_runtime = GoRuntime()
+        self.compute_resources = ComputeResources()
 
         self.db_name = "metrics"
         self.db_relation_name = "database"
@@ -129,27 +374,131 @@ class WorkloadAgentBuilder:
         self.db_port: Optional[int] = None
         self.db_username: Optional[str] = None
         self.db_password: Optional[str] = None
-
-        """The ingress provider is Traefik."""
+        self.db_relation_id: Optional[int] = None
+        self.db_read_endpoints: list[str] = []
+        self.db_read_round_robin = False
+        self.db_tuning = DbTuning()
+        self.unit_count = 1
+        self.unit_index = 0
+
+        """The ingress provider is Traefik; only the leader submits to it, every unit serves."""
         self.ingress_relation_name = "ingress"
         self.ingress_ready = False
+        self.ingress_sticky = False
+        self.ingress_limits = IngressLimits()
+
+        """Every unit publishes its address on the peer relation so Traefik can balance across pods."""
+        self.peer_relation_name = "peers"
+        self.unit_addresses: list[str] = []
 
         """These options are to wire up the workload to the observability stack."""
         self.log_level = LogLevel.Info
         self.log_file = "/var/log/workload.log"
+        self.log_files = [self.log_file]
+        self.log_rotation = LogRotation()
+        self.log_pipeline = LogPipeline()
+        self.log_path_label_regex = r"/(?P<log_source>[^/.]+)[^/]*$"
         self.log_relation_name = "log-proxy"
+        self.logging_mode = LoggingMode.Promtail
+        self.log_forwarding_supported = True
+        self.logging_mode_refused = False
+        self.loki_endpoints: list[str] = []
+        self.log_labels: dict[str, str] = {}
+        self.log_target_names: list[str] = []
         self.grafana_relation_name = "grafana-dashboard"
         self.metrics_relation_name = "metrics-endpoint"
+        self.charm_metrics_port = 0
+        # http.server serves .txt as text/plain, a content type every Prometheus accepts.
+        self.charm_metrics_file = "/var/lib/ubuntu-metrics/charm.txt"
 
     def load_config_values(self, config: ops.ConfigData) -> "WorkloadAgentBuilder":
         self.set_env(config.get("env", ""))
         self.set_log_level(config.get("log_level", ""))
+        self.set_health_check(
+            period=str(config.get("check_period", "10s")),
+            timeout=str(config.get("check_timeout", "3s")),
+            threshold=int(config.get("check_threshold", 3)),
+        )
+        self.set_db_read_round_robin(bool(config.get("db_read_round_robin", False)))
+        self.set_db_tuning(
+            DbTuning(
+                max_connections=int(config.get("db_max_connections", 100)),
+                connection_fraction=float(config.get("db_connection_fraction", 0.8)),
+                connect_timeout=int(config.get("db_connect_timeout", 10)),
+                statement_timeout_ms=int(config.get("db_statement_timeout_ms", 30000)),
+            )
+        )
+        self.set_go_runtime_overrides(
+            max_procs=int(config.get("go_max_procs", 0)),
+            memory_limit=str(config.get("go_memory_limit", "")),
+            memory_ratio=float(config.get("go_memory_limit_ratio", 0.9)),
+            gc=int(config.get("go_gc", 100)),
+        )
+        self.set_compute_resources(
+            ComputeResources(
+                cpu_request=str(config.get("workload_cpu_request", "")),
+                cpu_limit=str(config.get("workload_cpu_limit", "")),
+                memory_request=str(config.get("workload_memory_request", "")),
+                memory_limit=str(config.get("workload_memory_limit", "")),
+            )
+        )
+        self.set_log_rotation(
+            LogRotation(
+                max_bytes=int(config.get("log_rotate_max_mb", 100)) * 1024 * 1024,
+                max_age=int(config.get("log_rotate_max_age_hours", 24)) * 3600,
+                keep=max(int(config.get("log_rotate_keep", 3)), 1),
+            )
+        )
+        self.set_log_files(str(config.get("log_files", "")))
+        self.set_log_pipeline(
+            log_format=str(config.get("log_format", "logfmt")),
+            drop_levels=str(config.get("log_drop_levels_in_prod", "debug")),
+        )
+        self.set_logging_mode(str(config.get("logging_mode", "")))
+        self.set_charm_metrics_port(int(config.get("charm_metrics_port", 0)))
+        self.set_ingress_sticky(bool(config.get("ingress_sticky_sessions", False)))
+        self.set_ingress_limits(
+            IngressLimits(
+                rate_limit_average=int(config.get("ingress_rate_limit_average", 0)),
+                rate_limit_burst=int(config.get("ingress_rate_limit_burst", 0)),
+                max_in_flight=int(config.get("ingress_max_in_flight", 0)),
+                max_request_body_bytes=int(config.get("ingress_max_request_body_bytes", 0)),
+            )
+        )
         return self
 
     def set_env(self, value: str) -> "WorkloadAgentBuilder":
         self.env = WorkloadEnv.try_from_string(value)
         return self
 
+    def set_health_check(
+        self, period: str, timeout: str, threshold: int
+    ) -> "WorkloadAgentBuilder":
+        self.health_check = HealthCheck(period=period, timeout=timeout, threshold=threshold)
+        return self
+
+    def set_go_runtime_overrides(
+        self, max_procs: int, memory_limit: str, memory_ratio: float, gc: int
+    ) -> "WorkloadAgentBuilder":
+        self.go_runtime = replace(
+            self.go_runtime,
+            max_procs=max_procs,
+            memory_limit=memory_limit,
+            memory_ratio=memory_ratio,
+            gc=gc,
+        )
+        return self
+
+    def set_container_limits(
+        self, cpus: Optional[float], memory_bytes: Optional[int]
+    ) -> "WorkloadAgentBuilder":
+        self.go_runtime = replace(self.go_runtime, cpus=cpus, memory_bytes=memory_bytes)
+        return self
+
+    def set_compute_resources(self, value: ComputeResources) -> "WorkloadAgentBuilder":
+        self.compute_resources = value
+        return self
+
     def set_db_host(self, value: str) -> "WorkloadAgentBuilder":
         self.db_host = value
         return self
@@ -166,10 +515,112 @@ class WorkloadAgentBuilder:
         self.db_password = value
         return self
 
+    def set_db_relation_id(self, value: int) -> "WorkloadAgentBuilder":
+        self.db_relation_id = value
+        return self
+
+    def clear_db(self) -> "WorkloadAgentBuilder":
+        self.db_host = None
+        self.db_port = None
+        self.db_username = None
+        self.db_password = None
+        self.db_relation_id = None
+        self.db_read_endpoints = []
+        return self
+
+    def set_db_read_endpoints(self, value: list[str]) -> "WorkloadAgentBuilder":
+        self.db_read_endpoints = sorted(value)
+        return self
+
+    def set_db_read_round_robin(self, value: bool = True) -> "WorkloadAgentBuilder":
+        self.db_read_round_robin = value
+        return self
+
+    def set_db_tuning(self, value: DbTuning) -> "WorkloadAgentBuilder":
+        self.db_tuning = value
+        return self
+
+    def set_unit_count(self, value: int) -> "WorkloadAgentBuilder":
+        self.unit_count = max(value, 1)
+        return self
+
+    def set_unit_index(self, value: int) -> "WorkloadAgentBuilder":
+        self.unit_index = value
+        return self
+
     def set_ingress_ready(self, value: bool = True) -> "WorkloadAgentBuilder":
         self.ingress_ready = value
         return self
 
+    def set_ingress_sticky(self, value: bool = True) -> "WorkloadAgentBuilder":
+        self.ingress_sticky = value
+        return self
+
+    def set_ingress_limits(self, value: IngressLimits) -> "WorkloadAgentBuilder":
+        self.ingress_limits = value
+        return self
+
+    def set_unit_addresses(self, value: list[str]) -> "WorkloadAgentBuilder":
+        self.unit_addresses = sorted(set(value))
+        return self
+
+    def set_charm_metrics_port(self, value: int) -> "WorkloadAgentBuilder":
+        self.charm_metrics_port = value
+        return self
+
+    def set_log_files(self, value: str) -> "WorkloadAgentBuilder":
+        """Collect the workload's own log plus any comma-separated paths or glob patterns.
+
+        The newest rotated generation is tailed too, so promtail can finish reading it from
+        the offset carried over at rotation; older generations were fully read before.
+        """
+        own = [self.log_file]
+        if self.log_rotation.is_enabled:
+            own.append(f"{self.log_file}.1")
+
+        extra = [path.strip() for path in value.split(",") if path.strip()]
+        self.log_files = list(dict.fromkeys([*own, *extra]))
+        return self
+
+    def set_log_pipeline(self, log_format: str, drop_levels: str) -> "WorkloadAgentBuilder":
+        """Levels are only dropped in prod; staging and local keep every line for debugging."""
+        levels = [level.strip() for level in drop_levels.split(",") if level.strip()]
+        self.log_pipeline = LogPipeline(
+            log_format=log_format.lower(),
+            drop_levels=tuple(levels) if self.env == WorkloadEnv.Prod else (),
+        )
+        return self
+
+    def set_log_rotation(self, value: LogRotation) -> "WorkloadAgentBuilder":
+        self.log_rotation = value
+        return self
+
+    def set_logging_mode(self, value: str) -> "WorkloadAgentBuilder":
+        """Pebble mode falls back to promtail where Pebble cannot forward logs with labels."""
+        mode = LoggingMode.try_from_string(value)
+        self.logging_mode_refused = (
+            mode == LoggingMode.Pebble and not self.log_forwarding_supported
+        )
+        self.logging_mode = LoggingMode.Promtail if self.logging_mode_refused else mode
+        return self
+
+    def set_log_forwarding_supported(self, value: bool) -> "WorkloadAgentBuilder":
+        self.log_forwarding_supported = value
+        return self
+
+    def set_loki_endpoints(self, value: list[str]) -> "WorkloadAgentBuilder":
+        self.loki_endpoints = value
+        return self
+
+    def set_log_labels(self, value: dict[str, str]) -> "WorkloadAgentBuilder":
+        self.log_labels = value
+        return self
+
+    def set_log_target_names(self, value: list[str]) -> "WorkloadAgentBuilder":
+        """Name every log target pushed so far, so ones no longer wanted can be emptied."""
+        self.log_target_names = value
+        return self
+
     def set_log_level(self, value: str) -> "WorkloadAgentBuilder":
         self.log_level = LogLevel.try_from_string(value)
         return self
@@ -181,7 +632,7 @@ class WorkloadAgentBuilder:
                 self.db_host,
                 self.db_port,
                 self.db_username,
-                self.db_password,
+                self.db_password if self.db_relation_id is None else self.db_relation_id,
             ]
         )
 
@@ -191,11 +642,27 @@ class WorkloadAgentBuilder:
         if not self.env:
             return WorkloadAgentBuilderState.EnvNotSet
 
-        if not self.ingress_ready:
-            return WorkloadAgentBuilderState.IngressNotReady
-
         return WorkloadAgentBuilderState.Ready
 
+    def snapshot(self) -> str:
+        state = {field: getattr(self, field) for field in SNAPSHOT_FIELDS}
+        return json.dumps({"version": SNAPSHOT_VERSION, **state}, separators=(",", ":"))
+
+    def restore(self, snapshot: str) -> bool:
+        """Load a snapshot; False when it is missing or from another version."""
+        try:
+            state = json.loads(snapshot)
+        except json.JSONDecodeError:
+            return False
+
+        if state.get("version") != SNAPSHOT_VERSION:
+            return False
+
+        for field in SNAPSHOT_FIELDS:
+            setattr(self, field, state[field])
+
+        return True
+
     def build(self) -> WorkloadAgent:
         return WorkloadAgent(
             env=get_or_fail(self.env, "env"),
@@ -203,10 +670,29 @@ class WorkloadAgentBuilder:
             name=self.name,
             port=self.port,
             log_level=self.log_level,
+            health_check=self.health_check,
+            go_runtime=self.go_runtime,
+            compute_resources=self.compute_resources,
+            charm_metrics_port=self.charm_metrics_port,
+            charm_metrics_file=self.charm_metrics_file,
+            loki_endpoints=(
+                self.loki_endpoints if self.logging_mode == LoggingMode.Pebble else []
+            ),
+            log_labels=self.log_labels,
+            log_target_names=self.log_target_names,
+            unit_addresses=self.unit_addresses,
+            ingress_ready=self.ingress_ready,
+            ingress_sticky=self.ingress_sticky,
+            ingress_limits=self.ingress_limits,
             db_name=self.db_name,
             db_relation_name=self.db_relation_name,
             db_host=get_or_fail(self.db_host, "db_host"),
             db_port=get_or_fail(self.db_port, "db_port"),
             db_username=get_or_fail(self.db_username, "db_username"),
             db_password=get_or_fail(self.db_password, "db_password"),
+            db_read_endpoints=self.db_read_endpoints,
+            db_read_round_robin=self.db_read_round_robin,
+            db_tuning=self.db_tuning,
+            unit_count=self.unit_count,
+            unit_index=self.unit_index,
         )
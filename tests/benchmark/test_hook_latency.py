@@ -0,0 +1,200 @@
+# Copyright 2024 Tim Holmes-Mitra <tim.holmes-mitra@canonical.com>
+# See LICENSE file for licensing details.
+
+"""In-process hook cost benchmark for UbuntuMetrics.
+
+Drives the charm through realistic event sequences with ops.testing and records, per step,
+the wall time, the number of Pebble calls and the bytes of relation data the charm wrote.
+Results are written as JSON and compared against baseline.json next to this file.
+
+Pebble calls, relation bytes and reconciles are deterministic and always checked. Wall time
+is always reported but depends on the machine, so it is only checked when asked for.
+
+    BENCHMARK_OUTPUT=results.json   where to write results (default: .benchmark/results.json)
+    BENCHMARK_UPDATE_BASELINE=1     overwrite baseline.json with this run
+    BENCHMARK_TIME_TOLERANCE=3.0    also fail steps slower than this factor over the baseline
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+import pytest
+from charm import UbuntuMetrics
+from ops.testing import Harness
+
+BASELINE = Path(__file__).parent / "baseline.json"
+OUTPUT = Path(os.environ.get("BENCHMARK_OUTPUT", ".benchmark/results.json"))
+TIME_TOLERANCE = float(os.environ.get("BENCHMARK_TIME_TOLERANCE", "0"))
+TIME_SLACK_MS = 5.0
+
+
+class PebbleCounter:
+    """Counts every call the charm makes on the (testing) Pebble client."""
+
+    def __init__(self, client: Any) -> None:
+        self.calls = 0
+
+        for name in dir(client):
+            attr = getattr(client, name)
+            if name.startswith("_") or not callable(attr):
+                continue
+            setattr(client, name, self._counted(attr))
+
+    def _counted(self, method: Callable) -> Callable:
+        def counted(*args, **kwargs):
+            self.calls += 1
+            return method(*args, **kwargs)
+
+        return counted
+
+
+class Bench:
+    def __init__(self) -> None:
+        self.harness = Harness(UbuntuMetrics)
+        self.harness.set_model_name("desktop")
+        self.harness.add_network("10.1.0.5")
+        self.harness.begin()
+        self.results: list[dict] = []
+        self.relation_bytes = 0
+
+        charm = self.harness.charm
+        self.pebble = PebbleCounter(charm._container._pebble)
+
+        backend = self.harness._backend
+        update_relation_data = backend.update_relation_data
+        own = {charm.unit.name, charm.app.name}
+
+        def counted_update(relation_id, entity, data, **kwargs):
+            if entity.name in own:
+                self.relation_bytes += sum(len(k) + len(v) for k, v in data.items())
+            return update_relation_data(relation_id, entity, data, **kwargs)
+
+        backend.update_relation_data = counted_update  # type: ignore
+
+    def step(self, name: str, action: Callable[[], Any]) -> None:
+        """Run one dispatch: the events of `action`, then the end-of-dispatch commit."""
+        charm = self.harness.charm
+        calls, written, reconciles = self.pebble.calls, self.relation_bytes, charm._reconcile_count
+
+        start = time.perf_counter()
+        action()
+        self.harness.framework.commit()
+        wall_ms = (time.perf_counter() - start) * 1000
+
+        self.results.append(
+            {
+                "step": name,
+                "wall_ms": round(wall_ms, 3),
+                "pebble_calls": self.pebble.calls - calls,
+                "relation_bytes": self.relation_bytes - written,
+                "reconciles": charm._reconcile_count - reconciles,
+                "status": str(charm.unit.status),
+            }
+        )
+
+
+def deploy(bench: Bench) -> None:
+    harness = bench.harness
+    charm = harness.charm
+
+    bench.step("install", charm.on.install.emit)
+    bench.step("leader-elected", lambda: harness.set_leader(True))
+    bench.step("config-changed", lambda: harness.update_config({"env": "stg"}))
+    bench.step("peers-relation-created", lambda: harness.add_relation("peers", "ubuntu-metrics"))
+    bench.step("start", charm.on.start.emit)
+    bench.step("pebble-ready", lambda: harness.container_pebble_ready("workload"))
+
+    db = harness.add_relation("database", "postgresql")
+    harness.add_relation_unit(db, "postgresql/0")
+    bench.step(
+        "database-created",
+        lambda: harness.update_relation_data(
+            db,
+            "postgresql",
+            {
+                "endpoints": "postgresql-0.postgresql-endpoints:5432",
+                "read-only-endpoints": "postgresql-1.postgresql-endpoints:5432",
+                "username": "relation-5",
+                "password": "secret",
+                "database": "metrics",
+            },
+        ),
+    )
+
+    ingress = harness.add_relation("ingress", "traefik-route")
+    bench.step("ingress-joined", lambda: harness.add_relation_unit(ingress, "traefik-route/0"))
+
+
+def config_churn(bench: Bench) -> None:
+    for i in range(5):
+        level = "debug" if i % 2 == 0 else "info"
+        bench.step(f"config-churn-{i}", lambda: bench.harness.update_config({"log_level": level}))
+    bench.step("config-noop", lambda: bench.harness.charm.on.config_changed.emit())
+
+
+def leader_changes(bench: Bench) -> None:
+    bench.step("leader-lost", lambda: bench.harness.set_leader(False))
+    bench.step("leader-regained", lambda: bench.harness.set_leader(True))
+
+
+SEQUENCES = {
+    "deploy": [deploy],
+    "config-churn": [deploy, config_churn],
+    "leader-changes": [deploy, leader_changes],
+}
+
+
+def run_sequence(name: str) -> list[dict]:
+    bench = Bench()
+    for stage in SEQUENCES[name]:
+        stage(bench)
+    return bench.results
+
+
+def compare(name: str, results: list[dict], baseline: list[dict]) -> list[str]:
+    regressions = []
+
+    for result, expected in zip(results, baseline):
+        step = f"{name}/{result['step']}"
+        for metric in ("pebble_calls", "relation_bytes", "reconciles"):
+            if result[metric] > expected[metric]:
+                regressions.append(f"{step}: {metric} {expected[metric]} -> {result[metric]}")
+
+        allowed_ms = expected["wall_ms"] * TIME_TOLERANCE + TIME_SLACK_MS
+        if TIME_TOLERANCE and result["wall_ms"] > allowed_ms:
+            regressions.append(f"{step}: wall_ms {expected['wall_ms']} -> {result['wall_ms']}")
+
+    return regressions
+
+
+@pytest.fixture(scope="module")
+def report():
+    report: dict[str, list[dict]] = {}
+    yield report
+
+    OUTPUT.parent.mkdir(parents=True, exist_ok=True)
+    OUTPUT.write_text(json.dumps(report, indent=2) + "\n")
+
+    if os.environ.get("BENCHMARK_UPDATE_BASELINE"):
+        BASELINE.write_text(json.dumps(report, indent=2) + "\n")
+
+
+@pytest.mark.parametrize("sequence", sorted(SEQUENCES))
+def test_hook_cost(sequence: str, report: dict):
+    results = run_sequence(sequence)
+    report[sequence] = results
+
+    assert results[-1]["status"].startswith("ActiveStatus"), results[-1]
+
+    if os.environ.get("BENCHMARK_UPDATE_BASELINE") or not BASELINE.exists():
+        pytest.skip("no baseline to compare against")
+
+    baseline = json.loads(BASELINE.read_text()).get(sequence)
+    if baseline is None:
+        pytest.skip(f"no baseline for {sequence}")
+
+    regressions = compare(sequence, results, baseline)
+    assert not regressions, "\n".join(regressions)
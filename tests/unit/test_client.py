@@ -0,0 +1,48 @@
+# Copyright 2024 Tim Holmes-Mitra <tim.holmes-mitra@canonical.com>
+# See LICENSE file for licensing details.
+
+import pytest
+
+from client import LatencyHistogram, WorkloadClient
+from metrics import ClientTimings
+
+BASE_URL = "http://workload.test:8080"
+
+
+@pytest.fixture(autouse=True)
+def clients():
+    WorkloadClient._clients.clear()
+    yield
+    WorkloadClient._clients.clear()
+
+
+def test_for_base_url_merges_timeouts():
+    client = WorkloadClient.for_base_url(BASE_URL, timeouts={"version": 2})
+
+    assert WorkloadClient.for_base_url(BASE_URL) is client
+    assert WorkloadClient.for_base_url(BASE_URL, timeouts={"submit": 10}) is client
+    assert client.timeouts == {"version": 2, "submit": 10}
+
+
+def test_for_base_url_rejects_conflicting_settings():
+    WorkloadClient.for_base_url(BASE_URL, timeouts={"version": 2}, pool_size=4)
+
+    with pytest.raises(ValueError):
+        WorkloadClient.for_base_url(BASE_URL, timeouts={"version": 5})
+    with pytest.raises(ValueError):
+        WorkloadClient.for_base_url(BASE_URL, pool_size=1)
+
+
+def test_client_timings_collects_and_resets_histograms():
+    client = WorkloadClient.for_base_url(BASE_URL)
+    client.histograms.setdefault("version", LatencyHistogram()).observe(0.02)
+    timings = ClientTimings({})
+
+    timings.collect([client])
+    client.histograms.setdefault("version", LatencyHistogram()).observe(3, ok=False)
+    timings.collect([client])
+
+    histogram = timings.histograms["/version"]
+    assert (histogram.count, histogram.errors) == (2, 1)
+    assert client.histograms == {}
+    assert 'path="/version",le="+Inf"} 2' in timings.to_prometheus()
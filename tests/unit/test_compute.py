@@ -0,0 +1,57 @@
+# Copyright 2024 Tim Holmes-Mitra <tim.holmes-mitra@canonical.com>
+# See LICENSE file for licensing details.
+
+from types import SimpleNamespace
+
+import lightkube
+import pytest
+
+from compute import ComputeResourcesPatch
+from entities import ComputeResources
+
+
+class FakeClient:
+    """Holds one StatefulSet container and records the patches sent to it."""
+
+    resources = SimpleNamespace(requests={"cpu": "500m"}, limits={"cpu": "2"})
+    patches: list[dict] = []
+
+    def __init__(self, *args, **kwargs) -> None:
+        pass
+
+    def get(self, resource, name, namespace):
+        container = SimpleNamespace(name="workload", resources=self.resources)
+        return SimpleNamespace(
+            spec=SimpleNamespace(
+                template=SimpleNamespace(spec=SimpleNamespace(containers=[container]))
+            )
+        )
+
+    def patch(self, resource, name, patch, namespace, patch_type):
+        self.patches.append(patch)
+
+
+@pytest.fixture(autouse=True)
+def client(monkeypatch):
+    FakeClient.patches = []
+    monkeypatch.setattr(lightkube, "Client", FakeClient)
+    return FakeClient
+
+
+def test_apply_nulls_cleared_values(client):
+    patch = ComputeResourcesPatch("model", "app", "workload")
+
+    assert patch.apply(ComputeResources(cpu_limit="2"))
+
+    resources = client.patches[0]["spec"]["template"]["spec"]["containers"][0]["resources"]
+    assert resources == {
+        "requests": {"cpu": None, "memory": None},
+        "limits": {"cpu": "2", "memory": None},
+    }
+
+
+def test_apply_skips_matching_resources(client):
+    patch = ComputeResourcesPatch("model", "app", "workload")
+
+    assert not patch.apply(ComputeResources(cpu_request="0.5", cpu_limit="2"))
+    assert client.patches == []
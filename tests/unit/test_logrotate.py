@@ -0,0 +1,118 @@
+# Copyright 2024 Tim Holmes-Mitra <tim.holmes-mitra@canonical.com>
+# See LICENSE file for licensing details.
+
+import fnmatch
+import io
+import posixpath
+from types import SimpleNamespace
+
+import logrotate
+import ops
+import pytest
+import yaml
+
+LOG = "/var/log/workload.log"
+POSITIONS = "/opt/promtail/positions.yaml"
+
+
+class FakeContainer:
+    """In-memory files, with mv, cp and truncate run by Pebble exec."""
+
+    def __init__(self, files: dict[str, str]) -> None:
+        self.files = dict(files)
+        self.commands: list[list[str]] = []
+
+    def list_files(self, directory: str, pattern: str = "*"):
+        return [
+            SimpleNamespace(path=path)
+            for path in self.files
+            if posixpath.dirname(path) == directory
+            and fnmatch.fnmatch(posixpath.basename(path), pattern)
+        ]
+
+    def remove_path(self, path: str) -> None:
+        del self.files[path]
+
+    def pull(self, path: str):
+        if path not in self.files:
+            raise ops.pebble.PathError("not-found", path)
+        return io.StringIO(self.files[path])
+
+    def push(self, path: str, source: str, make_dirs: bool = False) -> None:
+        self.files[path] = source
+
+    def exec(self, command: list[str], timeout: float):
+        self.commands.append(command)
+        if command[0] == "mv":
+            self.files[command[3]] = self.files.pop(command[2])
+        elif command[0] == "cp":
+            self.files[command[3]] = self.files[command[2]]
+        elif command[0] == "truncate":
+            self.files[command[3]] = ""
+        return SimpleNamespace(wait=lambda: None)
+
+
+def positions(container: FakeContainer) -> dict:
+    return yaml.safe_load(container.files[POSITIONS])["positions"]
+
+
+@pytest.fixture
+def container():
+    return FakeContainer(
+        {
+            LOG: "current",
+            f"{LOG}.1": "first",
+            f"{LOG}.2": "second",
+            f"{LOG}.9": "stale",
+            f"{LOG}.lock": "not a generation",
+            POSITIONS: yaml.safe_dump(
+                {"positions": {LOG: "1500", f"{LOG}.1": "5", "/var/log/other.log": "7"}}
+            ),
+        }
+    )
+
+
+def test_rotate_shifts_generations(container: FakeContainer):
+    logrotate.rotate(container, LOG, keep=3)
+
+    assert container.files[LOG] == ""
+    assert container.files[f"{LOG}.1"] == "current"
+    assert container.files[f"{LOG}.2"] == "first"
+    assert container.files[f"{LOG}.3"] == "second"
+    assert f"{LOG}.9" not in container.files
+    assert container.files[f"{LOG}.lock"] == "not a generation"
+
+
+def test_rotate_keeps_a_single_generation(container: FakeContainer):
+    logrotate.rotate(container, LOG, keep=1)
+
+    assert container.files[f"{LOG}.1"] == "current"
+    assert f"{LOG}.2" not in container.files
+    assert not any(command[0] == "mv" for command in container.commands)
+
+
+def test_rotate_carries_the_promtail_offset_over(container: FakeContainer):
+    logrotate.rotate(container, LOG, keep=3, positions_path=POSITIONS)
+
+    assert positions(container) == {
+        LOG: "0",
+        f"{LOG}.1": "1500",
+        "/var/log/other.log": "7",
+    }
+
+
+def test_rotate_reads_an_unread_log_from_the_start(container: FakeContainer):
+    container.files[POSITIONS] = yaml.safe_dump({"positions": {}})
+
+    logrotate.rotate(container, LOG, keep=2, positions_path=POSITIONS)
+
+    assert positions(container) == {LOG: "0", f"{LOG}.1": "0"}
+
+
+def test_rotate_without_positions_file(container: FakeContainer):
+    del container.files[POSITIONS]
+
+    logrotate.rotate(container, LOG, keep=2, positions_path=POSITIONS)
+
+    assert POSITIONS not in container.files
+    assert container.files[f"{LOG}.1"] == "current"
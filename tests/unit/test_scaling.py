@@ -0,0 +1,79 @@
+# Copyright 2024 Tim Holmes-Mitra <tim.holmes-mitra@canonical.com>
+# See LICENSE file for licensing details.
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import scaling
+
+
+class FakeMetrics(BaseHTTPRequestHandler):
+    """Serves workload-shaped metrics, adding 100 requests and 1 error per scrape."""
+
+    scrapes = 0
+
+    def do_GET(self):  # noqa: N802
+        FakeMetrics.scrapes += 1
+        body = (
+            "# TYPE metrics_requests_total counter\n"
+            f'metrics_requests_total{{path="/"}} {FakeMetrics.scrapes * 60}\n'
+            f'metrics_requests_total{{path="/submit"}} {FakeMetrics.scrapes * 40}\n'
+            f"metrics_errors_total {FakeMetrics.scrapes}\n"
+            f"metrics_uptime_seconds {1000 + FakeMetrics.scrapes}\n"
+        ).encode()
+
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_):
+        pass
+
+
+@pytest.fixture
+def metrics_port():
+    FakeMetrics.scrapes = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeMetrics)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server.server_port
+    server.shutdown()
+
+
+def test_parse_metrics_sums_series():
+    metrics = scaling.parse_metrics(
+        "# HELP x\n"
+        'metrics_requests_total{path="/"} 3\n'
+        'metrics_requests_total{path="/submit"} 4 1700000000\n'
+        "metrics_uptime_seconds 12.5\n"
+    )
+
+    assert metrics == {"metrics_requests_total": 7.0, "metrics_uptime_seconds": 12.5}
+
+
+def test_advise_recommends_units_for_request_rate(metrics_port):
+    advice = scaling.advise(
+        ["127.0.0.1"], metrics_port, 0.5, target_rps_per_unit=50, max_error_ratio=0.05
+    )
+
+    [load] = advice.units
+    assert 150 < load.request_rate <= 200
+    assert load.error_ratio == pytest.approx(0.01)
+    assert advice.current_units == 1
+    assert advice.recommended_units == 4
+    assert advice.unreachable == []
+
+
+def test_advise_scales_out_on_errors_and_reports_unreachable(metrics_port):
+    advice = scaling.advise(
+        ["127.0.0.1", "127.0.0.2"],
+        metrics_port,
+        0,
+        target_rps_per_unit=1e9,
+        max_error_ratio=0.001,
+        sleep=lambda _: None,
+    )
+
+    assert advice.unreachable == ["127.0.0.2"]
+    assert advice.recommended_units == 3